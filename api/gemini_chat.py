@@ -1,6 +1,7 @@
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
+from utils.response_cache import get_response_cache
 
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
@@ -11,7 +12,21 @@ else:
 
 
 
-def generate_gemini_response(prompt, model_name="gemini-2.0-flash"):
+def generate_gemini_response(prompt, model_name="gemini-2.0-flash", dataset_fingerprint=None,
+                             question_embedding=None, context=None, use_cache=True):
+    # Repeated (or, with the same data context, rephrased) questions are answered from the local cache
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cached, _ = cache.get(prompt, dataset_fingerprint, model_name, question_embedding, context)
+        if cached is not None:
+            return cached
+
     model = genai.GenerativeModel(model_name)
     response = model.generate_content(prompt)
+
+    if cache is not None:
+        try:
+            cache.put(prompt, response.text, dataset_fingerprint, model_name, question_embedding, context)
+        except Exception as e:
+            print(f"⚠️ Could not cache Gemini response: {e}")
     return response.text
@@ -0,0 +1,28 @@
+import io
+import re
+import pandas as pd
+from utils.query_engine import RESULT_START, RESULT_END
+
+MAX_LISTED_ROWS = 5
+
+
+# Deterministic offline stand-in for generate_gemini_response: it reads the
+# result table out of an analytic prompt and restates its leading rows, so
+# the chatbot can run (and be tested) without network access or an API key.
+# It is instant, so the response-cache arguments are accepted and ignored.
+def generate_local_response(prompt, model_name="local", **cache_kwargs):
+    match = re.search(rf"{re.escape(RESULT_START)}\n(.*?)\n{re.escape(RESULT_END)}", prompt, re.S)
+    if not match:
+        block = re.search(r"relevant records:\n(.*?)\n\s*\nUser Question", prompt, re.S)
+        records = max(len(block.group(1).strip().splitlines()) - 1, 0) if block else 0
+        return f"Local model: {records} shipment records were retrieved; a detailed narrative needs the Gemini model."
+
+    table = pd.read_csv(io.StringIO(match.group(1)))
+    query = re.search(r"^Query: (.*)$", prompt, re.M)
+    lines = [f"{query.group(1) if query else 'Query result'} ({len(table)} row{'s' if len(table) != 1 else ''}):"]
+    for _, row in table.head(MAX_LISTED_ROWS).iterrows():
+        lines.append("- " + ", ".join(f"{column}: {value:,.2f}" if isinstance(value, float) else f"{column}: {value}"
+                                      for column, value in row.items()))
+    if len(table) > MAX_LISTED_ROWS:
+        lines.append(f"- ... {len(table) - MAX_LISTED_ROWS} more rows")
+    return "\n".join(lines)
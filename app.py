@@ -7,7 +7,7 @@ from components.shipment_mode_ui import render_shipment_mode_tab
 from components.data_entry_ui import render_data_entry_tab
 from components.Freight_Cost_Analysis import render_freight_cost_tab
 from components.homepage_ui import render_homepage
-from utils.google_sheets_loader import load_data_from_sheets
+from utils.storage_backends import get_backend_from_env
 
 st.set_page_config(
     page_title="PharmaFlow",
@@ -15,13 +15,21 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load dataset
-df, date_columns = load_data_from_sheets()
+# Load dataset through the configured storage backend (STORAGE_BACKEND / STORAGE_PATH, Sheets by default)
+backend = get_backend_from_env()
+if st.sidebar.button("🔄 Refresh data"):
+    backend.refresh()
+
+# Only pages that need the whole frame load it; the freight tab queries the backend with its filters
+FULL_FRAME_PAGES = {"forecast", "visualization", "price", "shipment", "chatbot"}
 
 # Initialize page
 if "page" not in st.session_state:
     st.session_state.page = "home"
 
+if st.session_state.page in FULL_FRAME_PAGES:
+    df, date_columns = backend.load()
+
 def go_home():
     st.session_state.page = "home"
 
@@ -34,7 +42,7 @@ if st.session_state.page == "home":
 
 elif st.session_state.page == "forecast":
     st.button("⬅️ Back to Home", on_click=go_home)
-    render_forecast_tab(df)
+    render_forecast_tab(df, backend)
 
 elif st.session_state.page == "visualization":
     st.button("⬅️ Back to Home", on_click=go_home)
@@ -54,7 +62,7 @@ elif st.session_state.page == "data_entry":
 
 elif st.session_state.page == "freight":
     st.button("⬅️ Back to Home", on_click=go_home)
-    render_freight_cost_tab(df)
+    render_freight_cost_tab(backend)
 
 elif st.session_state.page == "chatbot":
     st.button("⬅️ Back to Home", on_click=go_home)
@@ -3,27 +3,34 @@ import pandas as pd
 import plotly.express as px
 from utils.freight_utils import clean_freight_cost_column_with_id_priority
 
-def render_freight_cost_tab(df):
+def render_freight_cost_tab(backend):
     st.header("🚚 Freight Cost Analysis")
 
-    # Clean and prepare data
-    df = clean_freight_cost_column_with_id_priority(df)
-
-    # Filter dropdowns
-    country_list = sorted(df["Country"].dropna().unique())
-    product_list = sorted(df["Product Group"].dropna().unique())
+    # Filter dropdowns only need the key columns, not the whole dataset
+    keys = backend.query(columns=["Country", "Product Group", "Delivered to Client Date"])
+    country_list = sorted(keys["Country"].dropna().unique())
+    product_list = sorted(keys["Product Group"].dropna().unique())
+    delivered = keys["Delivered to Client Date"].dropna()
 
     selected_countries = st.multiselect(
     "Select Country", options=country_list, default=country_list, key="freight_country_select")
     selected_products = st.multiselect(
     "Select Product Group", options=product_list, default=product_list, key="freight_product_select")
+    date_range = st.date_input(
+    "Delivered between", value=(delivered.min().date(), delivered.max().date()), key="freight_date_range") if len(delivered) else ()
 
-
-    filtered_df = df[df["Country"].isin(selected_countries) & df["Product Group"].isin(selected_products)]
+    # Filters are pushed down to the storage backend; references were resolved at
+    # load, so cleaning the selection only median-fills its missing freight costs
+    filters = {"Country": selected_countries, "Product Group": selected_products}
+    # Undated shipments are only excluded once the range is actually narrowed
+    if len(date_range) == 2 and tuple(date_range) != (delivered.min().date(), delivered.max().date()):
+        filters["Delivered to Client Date"] = (date_range[0], pd.Timestamp(date_range[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1))
+    filtered_df = backend.query(filters=filters, columns=["Country", "Product Group", "Delivered to Client Date", "Freight Cost (USD)"])
 
     if filtered_df.empty:
         st.warning("No data available for selected filters.")
         return
+    filtered_df = clean_freight_cost_column_with_id_priority(filtered_df)
 
     # Summary stats
     st.subheader("Summary Statistics")
@@ -42,7 +49,6 @@ def render_freight_cost_tab(df):
 
     # Monthly trend
     st.subheader("📊 Monthly Avg Freight Cost (Seasonality)")
-    filtered_df["Delivered to Client Date"] = pd.to_datetime(filtered_df["Delivered to Client Date"], errors='coerce')
     filtered_df = filtered_df.dropna(subset=["Delivered to Client Date", "Freight Cost (USD)"])
     filtered_df["Month_Num"] = filtered_df["Delivered to Client Date"].dt.month
     filtered_df["Month"] = filtered_df["Delivered to Client Date"].dt.month_name()
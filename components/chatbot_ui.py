@@ -1,76 +1,64 @@
+import os
 import streamlit as st
-import pandas as pd
-from api.gemini_chat import generate_gemini_response
-from sentence_transformers import SentenceTransformer, util
-import json
+from sentence_transformers import SentenceTransformer
+from utils.embedding_index import search_records, EMBEDDING_MODEL_NAME
+from utils.query_engine import answer_table, describe_spec, build_analytic_prompt
+from utils.derived_data import dataset_fingerprint
+from utils.response_cache import get_response_cache
+from utils.prompt_context import (
+    build_record_context, fit_rows_to_budget, prompt_size_report, describe_prompt_size, DEFAULT_TOKEN_BUDGET
+)
 
 # ----------------------------
 # ✅ Load model safely (Mac M2)
 # ----------------------------
 @st.cache_resource
 def load_embedding_model():
-    return SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device='cpu')
 
 # ----------------------------
-# 🔁 Split DataFrame into chunks
+# 🧠 Retrieve shipments from the row-level vector index
 # ----------------------------
-def chunk_dataframe(df, chunk_size=200):
-    return [df.iloc[i:i+chunk_size] for i in range(0, len(df), chunk_size)]
+def get_most_relevant_records(df, query, model, top_k=100):
+    # Countries, product groups, vendors and dates named in the question narrow
+    # the rows first; the index then ranks the remaining shipments
+    return search_records(df, query, model, top_k=top_k)
 
 # ----------------------------
-# 🧠 Embed JSON-style text for better structure
+# 🤖 Answering model
 # ----------------------------
-def get_most_relevant_chunks(df_chunks, query, model, top_k=2):
-    json_chunks = []
-
-    for chunk in df_chunks:
-        chunk = chunk.copy()
-
-        # 🔁 Convert NaT / Timestamps to string
-        chunk = chunk.applymap(lambda x: str(x) if pd.isna(x) or isinstance(x, pd.Timestamp) else x)
-
-        # 🔁 Convert chunk to JSON string
-        json_str = json.dumps(chunk.to_dict(orient="records"), indent=2)
-        json_chunks.append(json_str)
-
-    # 🔍 Embed the chunks and compare with query
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    chunk_embeddings = model.encode(json_chunks, convert_to_tensor=True)
-
-    scores = util.cos_sim(query_embedding, chunk_embeddings)[0]
-    top_indices = scores.argsort(descending=True)[:top_k]
-
-    return [json_chunks[i] for i in top_indices]
-
+def get_llm():
+    # PHARMABOT_LLM=local answers with the deterministic offline stand-in
+    if os.getenv("PHARMABOT_LLM", "gemini") == "local":
+        from api.local_llm import generate_local_response
+        return generate_local_response
+    from api.gemini_chat import generate_gemini_response
+    return generate_gemini_response
 
 # ----------------------------
-# 🧠 Streamlit Tab with RAG
+# 📝 Retrieval prompt for free-form questions
 # ----------------------------
-def render_chatbot_tab(df):
-    st.header("🤖 PharmaBot")
-
-    user_query = st.text_area("Type your question here")
-
-    if st.button("Generate Analysis"):
-        if not user_query.strip():
-            st.warning("Please enter a question.")
-            return
-
-        model = load_embedding_model()
-        df_chunks = chunk_dataframe(df)
-        relevant_chunks = get_most_relevant_chunks(df_chunks, user_query, model)
-        structured_data = "\n\n".join(relevant_chunks)
-
-        column_description_text = """
+def build_retrieval_prompt(df, user_query, token_budget):
+    model = load_embedding_model()
+    with st.spinner("Searching shipment records..."):
+        records, filters = get_most_relevant_records(df, user_query, model)
+    if filters:
+        st.caption("Filters from your question: " + "; ".join(
+            f"{key}: {value[0].date()} to {value[1].date()}" if key == "date_range" else f"{key}: {', '.join(value)}"
+            for key, value in filters.items()))
+    # Records go in most relevant first, as compact CSV of the columns the question needs
+    structured_data, report = build_record_context(records, user_query, token_budget)
+
+    column_description_text = """
 You are analyzing structured shipment data with fields like:
 - Country, Vendor, Product Group, Dosage Form
 - Quantity, Line Item Value, Unit Price, Pack Price
 - Scheduled Delivery Date, Delivered Date, Freight Cost, Weight, Manufacturing Site
-Each entry is a JSON object with these fields and values.
+Records are CSV rows; the header names the fields included for this question.
 """
 
-        structured_prompt = f"""
-You are a supply chain analyst reviewing structured pharmaceutical shipment records (in JSON format).
+    prompt = f"""
+You are a supply chain analyst reviewing structured pharmaceutical shipment records (in CSV format).
 
 {column_description_text}
 
@@ -86,7 +74,57 @@ Instructions:
 - Do NOT include code. Do NOT invent data.
 - Return a concise, data-backed answer.
 """
+    return prompt, report, filters
+
+
+def retrieval_cache_scope(filters):
+    # Retrieved records differ with every phrasing, so retrieval answers are
+    # scoped by the filters taken from the question instead. Without filters
+    # every question would share one scope, so the semantic lookup is skipped
+    # (None) and only an exact prompt match is reused
+    if not filters:
+        return None
+    return "retrieval: " + "; ".join(f"{key}={value}" for key, value in sorted(filters.items()))
+
+
+# ----------------------------
+# 🧠 Streamlit Tab with RAG
+# ----------------------------
+def render_chatbot_tab(df):
+    st.header("🤖 PharmaBot")
+
+    user_query = st.text_area("Type your question here")
+    token_budget = st.slider("Context token budget", 500, 8000, DEFAULT_TOKEN_BUDGET, step=250, key="chat_token_budget")
 
-        response = generate_gemini_response(structured_prompt)
+    if st.button("Generate Analysis"):
+        if not user_query.strip():
+            st.warning("Please enter a question.")
+            return
+
+        # Aggregate questions are computed over the whole frame; only the result table is sent
+        spec, result = answer_table(df, user_query)
+        if spec is not None:
+            st.caption(f"Computed locally: {describe_spec(spec)}")
+            st.dataframe(result)
+            result, _ = fit_rows_to_budget(result, token_budget)
+            prompt = build_analytic_prompt(user_query, spec, result)
+            report = prompt_size_report(prompt)
+            # The prompt minus the question is the result table: the data context for semantic hits
+            context = prompt.replace(user_query, "")
+        else:
+            prompt, report, filters = build_retrieval_prompt(df, user_query, token_budget)
+            report = prompt_size_report(prompt, report)
+            context = retrieval_cache_scope(filters)
+        st.caption(describe_prompt_size(report))
+
+        question_embedding = load_embedding_model().encode(user_query, normalize_embeddings=True)
+        response = get_llm()(prompt, dataset_fingerprint=dataset_fingerprint(df), question_embedding=question_embedding,
+                             context=context)
         st.subheader("📊 AI Analysis")
         st.write(response)
+
+    with st.expander("Response cache"):
+        stats = get_response_cache().stats()
+        hit_rate = f"{stats['hit_rate']:.0%}" if stats['hit_rate'] is not None else "N/A"
+        st.write(f"{stats['entries']} cached answers, hit rate {hit_rate} "
+                 f"({stats['exact_hits']} exact, {stats['semantic_hits']} semantic, {stats['misses']} misses)")
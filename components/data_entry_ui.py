@@ -1,12 +1,19 @@
+import uuid
 import streamlit as st
 import datetime
 import pandas as pd
-from utils.google_sheets_loader import append_row_to_sheet
+from utils.google_sheets_loader import append_rows_to_sheet, dataframe_to_rows
+from utils.write_queue import get_write_queue
 
 def render_data_entry_tab():
     st.header("📤 Submit New Shipment Record")
 
     st.subheader("📝 Fill Individual Entry")
+    # One idempotency key per form render: a double-clicked submit reuses it and
+    # is written once, while a deliberately repeated order gets a fresh key
+    if "entry_form_key" not in st.session_state:
+        st.session_state.entry_form_key = uuid.uuid4().hex
+
     with st.form("entry_form"):
         col1, col2 = st.columns(2)
         product_group = col1.text_input("Product Group")
@@ -91,12 +98,26 @@ def render_data_entry_tab():
                 delivery_note, document_id, requisition_id, facility_name, facility_code
             ]
 
-            success = append_row_to_sheet(new_row)
+            # Queued locally and written to the sheet in the background
+            try:
+                _, queued, likely_duplicate = get_write_queue().enqueue(new_row, st.session_state.entry_form_key)
+                if queued:
+                    st.session_state.entry_form_key = uuid.uuid4().hex
+                    st.success("✅ Record submitted successfully!")
+                    if likely_duplicate:
+                        st.warning("⚠️ An identical record was submitted recently. It was still queued; "
+                                   "check it is not a duplicate.")
+                else:
+                    st.info("ℹ️ This record was already submitted.")
+            except Exception as e:
+                st.error(f"❌ Submission failed: {e}")
 
-            if success:
-                st.success("✅ Record submitted successfully!")
-            else:
-                st.error("❌ Submission failed. Please check the logs or try again.")
+    queue_metrics = get_write_queue().metrics()
+    if queue_metrics["depth"]:
+        st.caption(f"⏳ {queue_metrics['depth']} record(s) waiting to be written to the sheet "
+                   f"(oldest {queue_metrics['lag_seconds']:.0f}s ago).")
+        if queue_metrics["last_error"]:
+            st.caption(f"Last write error: {queue_metrics['last_error']} — retrying automatically.")
 
     st.divider()
 
@@ -107,16 +128,40 @@ def render_data_entry_tab():
         try:
             df = pd.read_csv(uploaded_file)
             st.dataframe(df.head())
+
+            # Remember how far this file got so a failed upload can resume
+            upload_key = f"csv_upload_{uploaded_file.name}_{uploaded_file.size}"
+            resume_from = st.session_state.get(upload_key, 0)
+            resume_mark = st.session_state.get(upload_key + "_after_row")
+            if 0 < resume_from < len(df):
+                st.info(f"ℹ️ {resume_from} of {len(df)} rows were already submitted. Submitting again resumes from row {resume_from + 1}.")
+            elif len(df) and resume_from >= len(df):
+                st.info("ℹ️ All rows of this file have already been submitted.")
+
+            batch_size = st.number_input("Rows per batch", min_value=1, max_value=5000, value=500, step=100)
+
             if st.button("Submit CSV Records"):
-                all_success = True
-                for _, row in df.iterrows():
-                    row_data = row.fillna("").tolist()
-                    success = append_row_to_sheet(row_data)
-                    if not success:
-                        all_success = False
-                if all_success:
+                progress = st.progress(resume_from / len(df) if len(df) else 0.0)
+                result = append_rows_to_sheet(
+                    dataframe_to_rows(df),
+                    batch_size=int(batch_size),
+                    start_row=resume_from,
+                    after_row=resume_mark,
+                    progress_callback=lambda done, total: progress.progress(done / total)
+                )
+                st.session_state[upload_key] = result["next_row"]
+                # Lets a resumed upload check whether the failed batch landed anyway
+                st.session_state[upload_key + "_after_row"] = (
+                    result["failures"][-1]["after_row"] if result["failures"] else None
+                )
+
+                if not result["failures"]:
                     st.success("✅ All CSV records submitted successfully!")
                 else:
-                    st.warning("⚠️ Some rows failed to submit. Check your data.")
+                    failure = result["failures"][-1]
+                    st.warning(
+                        f"⚠️ Batch covering rows {failure['rows'][0] + 1}-{failure['rows'][1]} failed: {failure['error']}. "
+                        f"{result['next_row']} of {result['total']} rows are in the sheet; submit again to resume."
+                    )
         except Exception as e:
-            st.error(f"❌ Error processing CSV: {e}")
\ No newline at end of file
+            st.error(f"❌ Error processing CSV: {e}")
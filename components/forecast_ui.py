@@ -2,16 +2,23 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from utils.forecasting import (
-    forecast_sales,
+    forecast_demand_series,
     get_forecast_confidence_level,
     get_model_quality_description,
     get_forecast_accuracy_description,
     calculate_reliability_score
 )
+from utils.date_parsing import ensure_datetime
+from utils.storage_backends import apply_filters
+from utils.demand_cube import get_demand_cube
+from utils.batch_forecasting import load_batch_results
+from utils.baseline_forecasting import METHOD_LABELS
+from utils.hierarchical_forecasting import hierarchical_forecast, RECONCILIATION_METHODS
+from utils.global_forecasting import forecast_global_selection, start_global_forecaster
 
 # Main Forecasting UI
 
-def render_forecast_tab(df):
+def render_forecast_tab(df, backend=None):
     st.header("📈 Demand Forecasting")
     st.subheader("Filter and Generate Forecast")
 
@@ -25,23 +32,48 @@ def render_forecast_tab(df):
 
     # Debug toggle
     show_debug = st.checkbox("Show debug info", value=False, key="debug_info")
+    model_options = {"sarimax": "SARIMAX", **METHOD_LABELS, "global": "Global gradient boosting (all series)"}
+    method = st.selectbox("Forecast model", list(model_options), format_func=model_options.get, key="demand_method")
+    auto_order = method == "sarimax" and st.checkbox("Automatic model selection (AIC search, up to 15s)", value=False, key="demand_auto_order")
+    # The global models train in the background once per dataset version
+    if method == "global" and not start_global_forecaster(df):
+        st.caption("⏳ Training the global model in the background (about 30s on first use); "
+                   "Generate Forecast waits for it to finish.")
+
+    # Coherent forecasts for every level of the Country / Product Group / Vendor hierarchy
+    if st.checkbox("Show coherent hierarchical forecasts", value=False, key="hierarchical_forecasts"):
+        reconciliation = st.selectbox("Reconciliation", list(RECONCILIATION_METHODS), format_func=RECONCILIATION_METHODS.get, key="reconciliation")
+        display_hierarchical_forecast(df, selected_countries, selected_products, reconciliation)
+
+    # Nightly batch results (python -m utils.batch_forecasting)
+    if st.checkbox("Show precomputed per-series forecasts", value=False, key="precomputed_forecasts"):
+        display_precomputed_forecasts(selected_countries, selected_products)
 
     # Generate Forecast button
     if st.button("Generate Forecast", key="generate_forecast_btn"):
         with st.spinner("Generating forecast..."):
-            # Filter data
-            filtered_df = df[df["Country"].isin(selected_countries) & df["Product Group"].isin(selected_products)]
+            # The selection's rows come from the storage backend with the filters pushed down;
+            # the models below still need every series, so they use the full frame
+            filters = {"Country": selected_countries, "Product Group": selected_products}
+            filtered_df = backend.query(filters=filters) if backend is not None else apply_filters(df, filters)
             if filtered_df.empty:
                 st.warning("No data for selected Country(ies) & Product Group(s)")
                 return
 
-            # Forecast
+            # Forecast every selected Country × Product Group from the precomputed weekly cube
             label = f"{' + '.join(selected_countries)} | {' + '.join(selected_products)}"
-            if show_debug:
-                sales_data, forecast, metrics, debug_info = forecast_sales(filtered_df, "Country", selected_countries[0], debug=True)
+            cube = get_demand_cube(df)
+            weekly_demand = cube.sales_data(selected_countries, selected_products)
+            if method == "global":
+                # One model trained across every series; the selection sums its per-series forecasts
+                forecast, metrics = forecast_global_selection(df, selected_countries, selected_products)
+                display_forecast_results(weekly_demand.to_frame(), forecast, metrics, label)
+            elif show_debug:
+                debug_info = cube.selection_stats(selected_countries, selected_products)
+                sales_data, forecast, metrics, debug_info = forecast_demand_series(weekly_demand, debug=True, debug_info=debug_info, auto_order=auto_order, method=method)
                 display_forecast_results(sales_data, forecast, metrics, label, debug_info)
             else:
-                sales_data, forecast, metrics = forecast_sales(filtered_df, "Country", selected_countries[0])
+                sales_data, forecast, metrics = forecast_demand_series(weekly_demand, auto_order=auto_order, method=method)
                 display_forecast_results(sales_data, forecast, metrics, label)
 
             # Additional tables
@@ -51,6 +83,46 @@ def render_forecast_tab(df):
             display_monthly_trend_seasonality(filtered_df)
 
 
+# Display reconciled hierarchical forecasts
+
+def display_hierarchical_forecast(df, countries, products, reconciliation):
+    with st.spinner("Forecasting and reconciling all hierarchy levels..."):
+        result, info = hierarchical_forecast(df, reconciliation=reconciliation)
+
+    st.caption(f"{info['nodes']} series ({info['bottom_series']} Country x Product Group x Vendor) forecast and reconciled in {info['seconds']}s")
+
+    # The selection total is the sum of its reconciled Country x Product Group series
+    pairs = result[(result["Level"] == "Country x Product Group") & result["Country"].isin(countries) & result["Product Group"].isin(products)]
+    selection = pairs.groupby("Week")[["Base Forecast", "Forecast"]].sum()
+    st.markdown("**Selected Country(ies) & Product Group(s)**")
+    st.dataframe(selection.round(0).T, use_container_width=True)
+
+    for level, column, selected in (("Country", "Country", countries), ("Product Group", "Product Group", products)):
+        rows = result[(result["Level"] == level) & result[column].isin(selected)]
+        st.markdown(f"**By {level}**")
+        st.dataframe(rows.pivot_table(index=column, columns="Week", values="Forecast").round(0), use_container_width=True)
+
+
+# Display nightly batch forecasts
+
+def display_precomputed_forecasts(countries, products):
+    forecasts, metrics = load_batch_results(countries=countries, products=products)
+    if forecasts is None:
+        st.info("No precomputed forecasts yet. Run `python -m utils.batch_forecasting` to build them.")
+        return
+    if metrics.empty:
+        st.warning("No precomputed forecasts for the selected Country(ies) & Product Group(s)")
+        return
+
+    st.caption(f"Batch run at {metrics['run_at'].max():%Y-%m-%d %H:%M}")
+    st.dataframe(metrics.drop(columns=["run_at"]).sort_values(["Country", "Product Group"]), use_container_width=True)
+
+    if not forecasts.empty:
+        table = forecasts.pivot_table(index=["Country", "Product Group"], columns="Week", values="Forecast")
+        table.columns = [f"{week:%Y-%m-%d}" for week in table.columns]
+        st.dataframe(table.round(0), use_container_width=True)
+
+
 # Display forecast results and charts
 
 def display_forecast_results(sales_data, forecast, metrics, label, debug_info=None):
@@ -77,6 +149,8 @@ def display_forecast_results(sales_data, forecast, metrics, label, debug_info=No
     st.plotly_chart(fig, use_container_width=True)
 
     # Metrics and details
+    if metrics.get("fallback"):
+        st.warning(metrics["fallback"])
     display_metrics(metrics)
     display_forecast_statistics(sales_data, forecast)
     display_forecast_details(forecast)
@@ -126,9 +200,25 @@ def display_model_details(metrics):
         params = metrics.get('model_params')
         if params:
             st.write(params.get('description', ''))
-            st.code(f"order={params['order']}, seasonal_order={params['seasonal_order']}")
+            if 'order' in params:
+                st.code(f"order={params['order']}, seasonal_order={params['seasonal_order']}")
+            selection = params.get('selection')
+            if selection:
+                budget_note = " (time budget reached)" if selection['budget_exhausted'] else ""
+                st.caption(f"Selected from {selection['candidates_evaluated']} candidates in {selection['seconds']}s{budget_note}; d={selection['d_from_adf']} from the ADF test, D={selection['D_from_variance']} from the seasonal variance check")
         acc_desc, status = get_forecast_accuracy_description(metrics.get('MAPE'))
         getattr(st, status)(acc_desc)
+        display_backtest(metrics.get('backtest'))
+
+# Rolling-origin accuracy per horizon
+
+def display_backtest(backtest):
+    if not backtest or backtest['by_horizon'].empty:
+        return
+    st.markdown(f"**Backtest accuracy by horizon** ({backtest['origins']} forecast origins)")
+    table = backtest['by_horizon'].set_index('horizon')
+    table.index = [f"{h} week{'s' if h > 1 else ''} ahead" for h in table.index]
+    st.dataframe(table.round(2))
 
 # Top 5 Manufacturing Sites by Quantity
 
@@ -148,8 +238,8 @@ def display_top_vendors(filtered_df):
             subset=["Vendor", "Line Item Quantity", "Scheduled Delivery Date", "Delivered to Client Date", "Freight Cost (USD)"]
         )
         .assign(
-            Scheduled=lambda d: pd.to_datetime(d["Scheduled Delivery Date"], errors='coerce'),
-            Delivered=lambda d: pd.to_datetime(d["Delivered to Client Date"], errors='coerce')
+            Scheduled=lambda d: ensure_datetime(d["Scheduled Delivery Date"]),
+            Delivered=lambda d: ensure_datetime(d["Delivered to Client Date"])
         )
         .dropna(subset=["Scheduled", "Delivered"])
     )
@@ -197,9 +287,7 @@ def display_monthly_trend_seasonality(filtered_df):
         st.warning("Delivered date not found in data.")
         return
 
-    filtered_df["Delivered to Client Date"] = pd.to_datetime(
-        filtered_df["Delivered to Client Date"], errors='coerce'
-    )
+    filtered_df["Delivered to Client Date"] = ensure_datetime(filtered_df["Delivered to Client Date"])
     filtered_df = filtered_df.dropna(subset=["Delivered to Client Date"])
 
     # Extract Year-Month and separate Month for ordering
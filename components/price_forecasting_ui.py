@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from utils.price_forecasting import preprocess_dataframe_for_forecast, prepare_timeseries_data, forecast_unit_price
+from utils.date_parsing import ensure_datetime
+from utils.derived_data import get_cleaned_dataset
+from utils.baseline_forecasting import PRICE_METHOD_LABELS
 
 def render_price_forecasting_tab(df):
     st.header("📈 Pharma Price Forecasting")
@@ -15,6 +18,8 @@ def render_price_forecasting_tab(df):
         st.error("Required columns are missing from the dataset!")
         st.stop()
 
+    df = get_cleaned_dataset(df)
+
     # --- Mandatory Filters ---
     product_group = st.selectbox("Select Product Group", sorted(df["Product Group"].dropna().unique()))
     df_filtered_pg = df[df["Product Group"] == product_group]
@@ -39,6 +44,15 @@ def render_price_forecasting_tab(df):
     sub_classification = st.multiselect("Select Sub Classification(s)", subclass_options, default=["Select All"])
 
     forecast_weeks = st.selectbox("Select Number of Weeks to Forecast", [1, 2, 3, 4, 5, 6])
+    model_options = {"sarimax": "SARIMAX", **PRICE_METHOD_LABELS}
+    method = st.selectbox("Forecast model", list(model_options), format_func=model_options.get, key="price_method")
+    auto_order = method == "sarimax" and st.checkbox("Automatic model selection (AIC search, up to 15s)", value=False, key="price_auto_order")
+    seasonality, harmonics = "seasonal_arima", 3
+    if method == "sarimax":
+        seasonality = st.radio("Yearly seasonality", ["seasonal_arima", "fourier"], horizontal=True, key="price_seasonality",
+                               format_func={"seasonal_arima": "Seasonal ARIMA (52-week lag)", "fourier": "Fourier terms (faster)"}.get)
+        if seasonality == "fourier":
+            harmonics = st.slider("Fourier harmonics", min_value=1, max_value=10, value=3, key="price_harmonics")
 
     # --- Final Filtering ---
     final_df = df_filtered_country.copy()
@@ -71,11 +85,12 @@ def render_price_forecasting_tab(df):
             # Clean after selection
             cleaned_df = preprocess_dataframe_for_forecast(final_df)
 
-            # Prepare timeseries
-            ts_df = prepare_timeseries_data(cleaned_df, date_col="Delivered to Client Date")
+            # Prepare timeseries (cleaned_df is already preprocessed)
+            ts_df = prepare_timeseries_data(cleaned_df, date_col="Delivered to Client Date", preprocessed=True)
 
             try:
-                history, forecast, metrics = forecast_unit_price(ts_df, forecast_weeks)
+                history, forecast, metrics = forecast_unit_price(ts_df, forecast_weeks, auto_order=auto_order, method=method,
+                                                                seasonality=seasonality, harmonics=harmonics)
                 display_forecast_results(history, forecast, metrics, product_group, country, forecast_weeks)
                 display_unit_price_seasonality(cleaned_df)
 
@@ -126,7 +141,10 @@ def display_forecast_results(history, forecast, metrics, product_group, country,
     with col4:
         st.metric("Max Price", f"${max_price:.2f}")
 
-    if metrics:
+    if metrics and metrics.get("fallback"):
+        st.warning(metrics["fallback"])
+
+    if metrics and metrics.get("mae") is not None:
         st.subheader("Model Evaluation Metrics")
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -134,6 +152,15 @@ def display_forecast_results(history, forecast, metrics, product_group, country,
         with col2:
             st.metric("Root Mean Squared Error (RMSE)", f"${metrics['rmse']:.2f}")
 
+        backtest = metrics.get("backtest")
+        if backtest and not backtest["by_horizon"].empty:
+            with col3:
+                st.metric("Backtest Origins", backtest["origins"])
+            st.dataframe(backtest["by_horizon"].set_index("horizon").round(3))
+
+    if metrics and metrics.get("model_params"):
+        st.caption(f"Model: {metrics['model_params']['description']}")
+
 def display_unit_price_seasonality(filtered_df):
     st.subheader("💰 Monthly Seasonality: Avg Unit Price")
 
@@ -147,9 +174,7 @@ def display_unit_price_seasonality(filtered_df):
         st.warning("Unit Price column missing.")
         return
 
-    filtered_df["Delivered to Client Date"] = pd.to_datetime(
-        filtered_df["Delivered to Client Date"], errors='coerce'
-    )
+    filtered_df["Delivered to Client Date"] = ensure_datetime(filtered_df["Delivered to Client Date"])
     filtered_df = filtered_df.dropna(subset=["Delivered to Client Date", unit_price_col])
     filtered_df["Month_Num"] = filtered_df["Delivered to Client Date"].dt.month
     filtered_df["Month"] = filtered_df["Delivered to Client Date"].dt.month_name()
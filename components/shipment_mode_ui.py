@@ -1,21 +1,18 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-
-# Import cleaning function
-from utils.price_forecasting import clean_freight_cost_column_with_id_priority
+from utils.derived_data import get_cleaned_dataset
 
 def render_shipment_mode_tab(df):
     st.header("🚛 Shipment Mode Analysis")
     st.subheader("Analyze Freight Costs and Trends by Shipment Mode")
 
-    # 🚛 Clean Freight Cost data
-    filtered_df = clean_freight_cost_column_with_id_priority(df)
+    # 🚛 Cleaned Freight Cost data, shared across tabs per dataset version
+    filtered_df = get_cleaned_dataset(df)
 
     # Fill missing values
     filtered_df["Shipment Mode"] = filtered_df["Shipment Mode"].fillna("Unknown")
     filtered_df["Freight Cost (USD)"] = filtered_df["Freight Cost (USD)"].fillna(0)
-    filtered_df["Delivered to Client Date"] = pd.to_datetime(filtered_df["Delivered to Client Date"], errors="coerce")
 
     # ------------------------------------------------
     # 📋 Corrected KPI Metrics
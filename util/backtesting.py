@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from utils.forecasting import improved_mean_absolute_percentage_error, calculate_reliability_score
+from utils.model_cache import fit_sarimax
+
+# ---------------------------------------------
+# 🔁 Rolling-origin backtest
+# ---------------------------------------------
+# The parameters fitted on the training window are applied to the whole
+# series once (results.apply: a Kalman filter pass, no optimisation). Each
+# origin's multi-step forecast is then a dynamic prediction starting from the
+# filtered state at that origin, identical to extending the training fit with
+# the observations up to the origin, so no origin ever refits the model.
+def rolling_origin_forecasts(results, series, first_origin, horizons=6, step=1, lower_bound=None, exog=None):
+    full = results.apply(series, exog=exog)
+    values = np.asarray(series, dtype=float).ravel()
+    records = []
+
+    for origin in range(first_origin, len(values), step):
+        steps = min(horizons, len(values) - origin)
+        predicted = full.get_prediction(start=origin, end=origin + steps - 1, dynamic=True).predicted_mean
+        predicted = np.asarray(predicted, dtype=float).ravel()
+        if lower_bound is not None:
+            predicted = np.maximum(predicted, lower_bound)
+
+        for h in range(steps):
+            records.append({
+                "origin": series.index[origin - 1],
+                "horizon": h + 1,
+                "target": series.index[origin + h],
+                "actual": values[origin + h],
+                "forecast": predicted[h],
+            })
+
+    return pd.DataFrame(records, columns=["origin", "horizon", "target", "actual", "forecast"])
+
+
+def _accuracy(actual, forecast):
+    mape = float(improved_mean_absolute_percentage_error(actual, forecast))
+    r2 = float(r2_score(actual, forecast)) if len(actual) >= 2 else None
+    return {
+        "MAPE": mape,
+        "RMSE": float(np.sqrt(mean_squared_error(actual, forecast))),
+        "MAE": float(mean_absolute_error(actual, forecast)),
+        "R2": r2,
+        "reliability_score": calculate_reliability_score(mape, r2),
+    }
+
+
+def summarize_backtest(forecasts):
+    if forecasts.empty:
+        return pd.DataFrame(columns=["horizon", "origins", "MAPE", "RMSE", "MAE", "R2", "reliability_score"])
+
+    rows = []
+    for horizon, group in forecasts.groupby("horizon"):
+        rows.append({"horizon": horizon, "origins": len(group), **_accuracy(group["actual"], group["forecast"])})
+    return pd.DataFrame(rows)
+
+
+def backtest_summary(forecasts, horizons):
+    return {
+        "origins": int(forecasts["origin"].nunique()) if len(forecasts) else 0,
+        "horizons": horizons,
+        "by_horizon": summarize_backtest(forecasts),
+        "overall": _accuracy(forecasts["actual"], forecasts["forecast"]) if len(forecasts) else {},
+    }
+
+
+def rolling_origin_backtest(results, series, first_origin, horizons=6, step=1, lower_bound=None, exog=None):
+    forecasts = rolling_origin_forecasts(results, series, first_origin, horizons, step, lower_bound, exog)
+    return backtest_summary(forecasts, horizons)
+
+
+def backtest_sarimax(series, order, seasonal_order, initial_fraction=0.8, horizons=6, step=1,
+                     lower_bound=None, fit_kwargs=None, **model_kwargs):
+    # One fit on the initial window; every later origin reuses its parameters
+    first_origin = max(int(len(series) * initial_fraction), 1)
+    if first_origin >= len(series):
+        raise ValueError("Series too short to leave any backtest origins.")
+
+    results = fit_sarimax(series.iloc[:first_origin], order, seasonal_order, fit_kwargs=fit_kwargs, **model_kwargs)
+    return rolling_origin_backtest(results, series, first_origin, horizons, step, lower_bound)
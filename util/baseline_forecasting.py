@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+from utils.date_parsing import ensure_datetime
+from utils.backtesting import backtest_summary
+
+ALPHA_GRID = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+BETA_GRID = np.array([0.01, 0.05, 0.1, 0.2])
+DAMPING = 0.98
+INTERMITTENT_ADI = 1.32
+
+METHOD_LABELS = {
+    "auto": "Auto baseline (SES / Holt / TSB)",
+    "ses": "Simple exponential smoothing",
+    "holt": "Holt (damped trend)",
+    "seasonal_naive": "Seasonal naive",
+    "croston": "Croston (SBA)",
+    "tsb": "TSB (intermittent demand)",
+}
+# Prices are never intermittent, so their auto choice skips TSB and the
+# Croston/TSB methods are not offered for them
+PRICE_METHOD_LABELS = {
+    "smooth_auto": "Auto baseline (SES / Holt)",
+    "ses": METHOD_LABELS["ses"],
+    "holt": METHOD_LABELS["holt"],
+    "seasonal_naive": METHOD_LABELS["seasonal_naive"],
+}
+
+# ---------------------------------------------
+# 🧮 Matrix engines
+# ---------------------------------------------
+# Every engine takes an (S, T) float matrix, one series per row, with NaN
+# only before a series starts, and returns an (S, horizon) forecast. The
+# recursion loops over time once; all series (and all smoothing parameters
+# on the grid) are updated together as array operations.
+def _as_matrix(Y):
+    Y = np.asarray(Y, dtype=float)
+    return Y[np.newaxis, :] if Y.ndim == 1 else Y
+
+
+def _last_value(Y):
+    filled = pd.DataFrame(Y).ffill(axis=1).to_numpy()
+    return filled[:, -1] if filled.shape[1] else np.full(len(Y), np.nan)
+
+
+def _smooth(Y, alphas, betas=None, phi=1.0, record=False):
+    # Level (and optional damped trend) for every (parameter, series) pair,
+    # with the one-step-ahead squared error used to pick parameters. A 1-D
+    # grid is tried on every series; a (1, S) row gives each series its own.
+    alphas = alphas[:, np.newaxis] if alphas.ndim == 1 else alphas
+    betas = betas[:, np.newaxis] if betas is not None and betas.ndim == 1 else betas
+    shape = (alphas.shape[0], Y.shape[0])
+    level = np.full(shape, np.nan)
+    trend = np.zeros(shape)
+    sse = np.zeros(shape)
+    fitted = np.full(shape + (Y.shape[1],), np.nan) if record else None
+
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        started = ~np.isnan(level)
+        prediction = level + phi * trend
+        if record:
+            fitted[:, :, t] = prediction
+        error = np.where(observed & started, y - prediction, 0.0)
+        sse += error ** 2
+
+        new_level = np.where(started, prediction + alphas * error, y)
+        if betas is not None:
+            trend = np.where(started, phi * trend + alphas * betas * error, 0.0)
+        level = np.where(observed, new_level, level)
+
+    return level, trend, sse, fitted
+
+
+def _best(sse):
+    return np.argmin(sse, axis=0), np.arange(sse.shape[1])
+
+
+def ses_matrix(Y, horizon, alphas=ALPHA_GRID):
+    Y = _as_matrix(Y)
+    _, _, sse, _ = _smooth(Y, alphas)
+    best, _ = _best(sse)
+    # Second pass with each series' chosen alpha records its one-step predictions
+    level, _, _, fitted = _smooth(Y, alphas[best][np.newaxis, :], record=True)
+    return np.repeat(level[0][:, np.newaxis], horizon, axis=1), fitted[0]
+
+
+def holt_matrix(Y, horizon, alphas=ALPHA_GRID, betas=BETA_GRID, phi=DAMPING):
+    Y = _as_matrix(Y)
+    grid_alpha, grid_beta = np.meshgrid(alphas, betas, indexing="ij")
+    grid_alpha, grid_beta = grid_alpha.ravel(), grid_beta.ravel()
+    _, _, sse, _ = _smooth(Y, grid_alpha, grid_beta, phi)
+    best, _ = _best(sse)
+    level, trend, _, fitted = _smooth(Y, grid_alpha[best][np.newaxis, :], grid_beta[best][np.newaxis, :], phi, record=True)
+    steps = np.cumsum(phi ** np.arange(1, horizon + 1))
+    return level[0][:, np.newaxis] + trend[0][:, np.newaxis] * steps, fitted[0]
+
+
+def seasonal_naive_matrix(Y, horizon, season_length=52):
+    Y = _as_matrix(Y)
+    last = _last_value(Y)
+    fitted = np.full(Y.shape, np.nan)
+    if Y.shape[1] < season_length:
+        return np.repeat(last[:, np.newaxis], horizon, axis=1), fitted
+
+    fitted[:, season_length:] = Y[:, :-season_length]
+    season = Y[:, -season_length:]
+    forecast = season[:, np.arange(horizon) % season_length]
+    # Series younger than one season repeat their last value instead
+    return np.where(np.isnan(forecast), last[:, np.newaxis], forecast), fitted
+
+
+def croston_matrix(Y, horizon, alpha=0.1, variant="sba"):
+    Y = _as_matrix(Y)
+    size = np.full(Y.shape[0], np.nan)
+    interval = np.full(Y.shape[0], np.nan)
+    since_demand = np.zeros(Y.shape[0])
+    fitted = np.full(Y.shape, np.nan)
+    factor = 1 - alpha / 2 if variant == "sba" else 1.0
+
+    for t in range(Y.shape[1]):
+        fitted[:, t] = factor * size / interval
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        since_demand += observed
+        demand = observed & (y > 0)
+        first = demand & np.isnan(size)
+
+        size = np.where(demand & ~first, size + alpha * (y - size), size)
+        interval = np.where(demand & ~first, interval + alpha * (since_demand - interval), interval)
+        size = np.where(first, y, size)
+        interval = np.where(first, since_demand, interval)
+        since_demand = np.where(demand, 0, since_demand)
+
+    rate = np.nan_to_num(factor * size / interval)
+    return np.repeat(rate[:, np.newaxis], horizon, axis=1), fitted
+
+
+def tsb_matrix(Y, horizon, alpha=0.1, beta=0.1):
+    Y = _as_matrix(Y)
+    size = np.full(Y.shape[0], np.nan)
+    probability = np.full(Y.shape[0], np.nan)
+    fitted = np.full(Y.shape, np.nan)
+
+    for t in range(Y.shape[1]):
+        fitted[:, t] = probability * np.nan_to_num(size)
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        demand = observed & (y > 0)
+
+        # Demand probability decays every period, so dead series fade to zero
+        occurred = demand.astype(float)
+        probability = np.where(observed & np.isnan(probability), occurred,
+                               np.where(observed, probability + beta * (occurred - probability), probability))
+        size = np.where(demand & np.isnan(size), y,
+                        np.where(demand, size + alpha * (y - size), size))
+
+    rate = np.nan_to_num(probability * size)
+    return np.repeat(rate[:, np.newaxis], horizon, axis=1), fitted
+
+
+def average_demand_interval(Y):
+    Y = _as_matrix(Y)
+    observed = (~np.isnan(Y)).sum(axis=1)
+    demands = (np.nan_to_num(Y) > 0).sum(axis=1)
+    return np.where(demands > 0, observed / np.maximum(demands, 1), np.inf)
+
+
+def _one_step_sse(Y, fitted):
+    return np.nansum((Y - fitted) ** 2, axis=1)
+
+
+def forecast_matrix(Y, horizon, method="auto", season_length=52, return_fitted=False):
+    Y = _as_matrix(Y)
+    if method == "ses":
+        forecast, fitted = ses_matrix(Y, horizon)
+    elif method == "holt":
+        forecast, fitted = holt_matrix(Y, horizon)
+    elif method == "seasonal_naive":
+        forecast, fitted = seasonal_naive_matrix(Y, horizon, season_length)
+    elif method == "croston":
+        forecast, fitted = croston_matrix(Y, horizon)
+    elif method == "tsb":
+        forecast, fitted = tsb_matrix(Y, horizon)
+    elif method in ("auto", "smooth_auto"):
+        # Intermittent rows (Syntetos-Boylan ADI cut-off) go to TSB; the rest take
+        # whichever of SES and Holt had the lower one-step-ahead error
+        ses, ses_fitted = ses_matrix(Y, horizon)
+        holt, holt_fitted = holt_matrix(Y, horizon)
+        use_holt = (_one_step_sse(Y, holt_fitted) < _one_step_sse(Y, ses_fitted))[:, np.newaxis]
+        forecast = np.where(use_holt, holt, ses)
+        fitted = np.where(use_holt, holt_fitted, ses_fitted)
+        if method == "auto":
+            tsb, tsb_fitted = tsb_matrix(Y, horizon)
+            intermittent = (average_demand_interval(Y) > INTERMITTENT_ADI)[:, np.newaxis]
+            forecast = np.where(intermittent, tsb, forecast)
+            fitted = np.where(intermittent, tsb_fitted, fitted)
+    else:
+        raise ValueError(f"Unknown baseline method '{method}'")
+
+    return (forecast, fitted) if return_fitted else forecast
+
+# ---------------------------------------------
+# 📦 Series helpers
+# ---------------------------------------------
+def _future_index(index, horizon):
+    return pd.date_range(index[-1] + pd.Timedelta(weeks=1), periods=horizon, freq="W")
+
+
+def forecast_baseline_series(series, horizon, method="auto", season_length=52, lower_bound=None):
+    forecast = forecast_matrix(series.to_numpy(dtype=float), horizon, method, season_length)[0]
+    if lower_bound is not None:
+        forecast = np.maximum(forecast, lower_bound)
+    return pd.Series(forecast, index=_future_index(series.index, horizon))
+
+
+def backtest_baseline(series, first_origin, horizons=6, method="auto", season_length=52, lower_bound=None):
+    # Every origin becomes one right-aligned row, so the whole backtest is a single matrix forecast
+    values = series.to_numpy(dtype=float)
+    origins = np.arange(first_origin, len(values))
+    if not len(origins):
+        return backtest_summary(pd.DataFrame(columns=["origin", "horizon", "target", "actual", "forecast"]), horizons)
+
+    matrix = np.full((len(origins), origins[-1]), np.nan)
+    for row, origin in enumerate(origins):
+        matrix[row, matrix.shape[1] - origin:] = values[:origin]
+
+    forecasts = forecast_matrix(matrix, horizons, method, season_length)
+    if lower_bound is not None:
+        forecasts = np.maximum(forecasts, lower_bound)
+
+    records = [
+        {"origin": series.index[origin - 1], "horizon": h + 1, "target": series.index[origin + h],
+         "actual": values[origin + h], "forecast": forecasts[row, h]}
+        for row, origin in enumerate(origins)
+        for h in range(min(horizons, len(values) - origin))
+    ]
+    return backtest_summary(pd.DataFrame(records), horizons)
+
+
+def series_matrix(df, keys, value_col="Line Item Quantity", date_col="Delivered to Client Date", agg="sum"):
+    # One row per key combination and one column per week; weeks before a
+    # series' first delivery stay NaN, later empty weeks are zero demand
+    frame = df[list(keys) + [date_col, value_col]].copy()
+    frame[date_col] = ensure_datetime(frame[date_col])
+    frame[value_col] = pd.to_numeric(frame[value_col], errors="coerce")
+    frame = frame.dropna()
+    if frame.empty:
+        return pd.DataFrame(columns=list(keys)), pd.DatetimeIndex([]), np.zeros((0, 0))
+
+    frame["Week"] = frame[date_col].dt.to_period("W-SUN").dt.end_time.dt.normalize()
+    table = frame.groupby(list(keys) + ["Week"], observed=True)[value_col].agg(agg).unstack("Week")
+    weeks = pd.date_range(table.columns.min(), table.columns.max(), freq="W")
+    table = table.reindex(columns=weeks)
+
+    values = table.to_numpy(dtype=float)
+    started = np.cumsum(~np.isnan(values), axis=1) > 0
+    values = np.where(started & np.isnan(values), 0.0, values)
+    return table.index.to_frame(index=False), weeks, values
+
+
+def forecast_all_series(df, keys=("Country", "Product Group", "Vendor"), horizon=6, method="auto",
+                        value_col="Line Item Quantity", lower_bound=0):
+    labels, weeks, values = series_matrix(df, keys, value_col)
+    if not len(labels):
+        return pd.DataFrame(columns=list(keys) + ["Week", "Forecast"])
+
+    forecasts = forecast_matrix(values, horizon, method)
+    if lower_bound is not None:
+        forecasts = np.maximum(forecasts, lower_bound)
+
+    future = _future_index(weeks, horizon)
+    result = labels.loc[labels.index.repeat(horizon)].reset_index(drop=True)
+    result["Week"] = np.tile(future, len(labels))
+    result["Forecast"] = forecasts.ravel()
+    return result
@@ -0,0 +1,246 @@
+import os
+import time
+import signal
+import argparse
+import warnings
+import multiprocessing
+from collections import deque
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.demand_cube import DemandCube, COUNTRY_COL, PRODUCT_COL
+from utils.forecasting import forecast_demand_series
+
+BATCH_RESULTS_DIR = os.path.join(".cache", "batch_forecasts")
+FORECASTS_FILE = "forecasts.parquet"
+METRICS_FILE = "metrics.parquet"
+DEFAULT_TIMEOUT_SECONDS = 60
+DEFAULT_MIN_POINTS = 5
+# Slack on top of the fit timeout for worker start-up before the parent
+# kills a fit that SIGALRM could not interrupt
+HARD_TIMEOUT_GRACE_SECONDS = 30
+POLL_SECONDS = 0.1
+
+FORECASTS_SCHEMA = pa.schema([
+    (COUNTRY_COL, pa.string()), (PRODUCT_COL, pa.string()),
+    ("Week", pa.timestamp("ns")), ("Forecast", pa.float64()), ("run_at", pa.timestamp("ns")),
+])
+METRICS_SCHEMA = pa.schema([
+    (COUNTRY_COL, pa.string()), (PRODUCT_COL, pa.string()),
+    ("status", pa.string()), ("error", pa.string()),
+    ("data_points", pa.int64()), ("fit_seconds", pa.float64()),
+    ("RMSE", pa.float64()), ("MAE", pa.float64()), ("MAPE", pa.float64()), ("R2", pa.float64()),
+    ("reliability_score", pa.float64()), ("confidence_level", pa.string()), ("model", pa.string()),
+    ("run_at", pa.timestamp("ns")),
+])
+
+
+class SeriesTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise SeriesTimeout()
+
+# ---------------------------------------------
+# 🧮 Per-series worker
+# ---------------------------------------------
+def _fit_series(country, product, sales_data, timeout, auto_order=False):
+    warnings.filterwarnings("ignore")
+    result = {COUNTRY_COL: country, PRODUCT_COL: product, "data_points": len(sales_data)}
+    start = time.perf_counter()
+
+    # Best effort: SIGALRM only fires between Python bytecodes and does not exist
+    # on Windows; _run_pool enforces the hard limit by recycling the worker
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(timeout))
+    try:
+        # Each series already has its own worker, so the order search runs in-process
+        _, forecast, metrics = forecast_demand_series(sales_data, auto_order=auto_order, workers=1)
+        if metrics.get("error"):
+            result.update(status="skipped", error=metrics["error"])
+        else:
+            result.update(status="ok", error=None, forecast=forecast, metrics=metrics)
+    except SeriesTimeout:
+        result.update(status="timeout", error=f"Fit exceeded {timeout}s")
+    except Exception as e:
+        result.update(status="failed", error=str(e))
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+    result["fit_seconds"] = time.perf_counter() - start
+    return result
+
+# ---------------------------------------------
+# 🏭 Batch engine
+# ---------------------------------------------
+def enumerate_series(df, min_points=DEFAULT_MIN_POINTS):
+    cube = DemandCube.from_dataframe(df)
+    for (ci, pi) in sorted(cube.stats):
+        country, product = cube.countries[ci], cube.products[pi]
+        sales_data = cube.sales_data([country], [product])
+        if len(sales_data) >= min_points:
+            yield country, product, sales_data
+
+
+def _metrics_record(result, run_at):
+    metrics = result.get("metrics", {})
+    confidence = metrics.get("confidence", {})
+    return {
+        COUNTRY_COL: result[COUNTRY_COL],
+        PRODUCT_COL: result[PRODUCT_COL],
+        "status": result["status"],
+        "error": result["error"],
+        "data_points": result["data_points"],
+        "fit_seconds": result["fit_seconds"],
+        "RMSE": metrics.get("RMSE"),
+        "MAE": metrics.get("MAE"),
+        "MAPE": metrics.get("MAPE"),
+        "R2": metrics.get("R2"),
+        "reliability_score": metrics.get("reliability_score"),
+        "confidence_level": confidence.get("level"),
+        "model": metrics.get("model_params", {}).get("description"),
+        "run_at": run_at,
+    }
+
+
+def _timeout_result(task, timeout):
+    country, product, sales_data = task
+    return {COUNTRY_COL: country, PRODUCT_COL: product, "data_points": len(sales_data),
+            "status": "timeout", "error": f"Fit exceeded {timeout}s and its worker was stopped",
+            "fit_seconds": float(timeout + HARD_TIMEOUT_GRACE_SECONDS)}
+
+
+def _run_pool(tasks, workers, timeout, auto_order, on_result):
+    # At most one task per worker is in flight, so a task starts when it is
+    # submitted and its deadline can be tracked from here. A task past its
+    # deadline is recorded as a timeout and the pool is terminated; the other
+    # in-flight tasks are requeued on a fresh pool. Spawned workers avoid
+    # forking a process that may be running threads.
+    context = multiprocessing.get_context("spawn")
+    workers = workers or os.cpu_count() or 1
+    pending = deque(tasks)
+    deadline = timeout + HARD_TIMEOUT_GRACE_SECONDS if timeout else None
+
+    while pending:
+        pool = context.Pool(workers)
+        running = {}
+        stalled = False
+        try:
+            while (pending or running) and not stalled:
+                while pending and len(running) < workers:
+                    task = pending.popleft()
+                    running[pool.apply_async(_fit_series, (*task, timeout, auto_order))] = (task, time.monotonic())
+
+                time.sleep(POLL_SECONDS)
+                for async_result, (task, started) in list(running.items()):
+                    if async_result.ready():
+                        del running[async_result]
+                        on_result(async_result.get())
+                    elif deadline and time.monotonic() - started > deadline:
+                        del running[async_result]
+                        on_result(_timeout_result(task, timeout))
+                        stalled = True
+
+            pending.extendleft(task for task, _ in reversed(list(running.values())))
+        finally:
+            if stalled:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+
+
+def run_batch_forecast(df, output_dir=BATCH_RESULTS_DIR, workers=None, timeout=DEFAULT_TIMEOUT_SECONDS,
+                       min_points=DEFAULT_MIN_POINTS, auto_order=False, progress_callback=None):
+    run_at = pd.Timestamp.now()
+    tasks = list(enumerate_series(df, min_points))
+
+    forecasts, records = [], []
+
+    def on_result(result):
+        records.append(_metrics_record(result, run_at))
+        if result["status"] == "ok":
+            forecasts.append(pd.DataFrame({
+                COUNTRY_COL: result[COUNTRY_COL],
+                PRODUCT_COL: result[PRODUCT_COL],
+                "Week": result["forecast"].index,
+                "Forecast": result["forecast"].to_numpy(),
+                "run_at": run_at,
+            }))
+        if progress_callback:
+            progress_callback(len(records), len(tasks))
+
+    _run_pool(tasks, workers, timeout, auto_order, on_result)
+
+    os.makedirs(output_dir, exist_ok=True)
+    metrics_df = pd.DataFrame(records, columns=METRICS_SCHEMA.names)
+    forecasts_df = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(columns=FORECASTS_SCHEMA.names)
+
+    # Explicit schemas keep the column types, so filtering an empty result still works
+    for frame, name, schema in ((forecasts_df, FORECASTS_FILE, FORECASTS_SCHEMA), (metrics_df, METRICS_FILE, METRICS_SCHEMA)):
+        path = os.path.join(output_dir, name)
+        pq.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False), path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    return forecasts_df, metrics_df
+
+
+def load_batch_results(output_dir=BATCH_RESULTS_DIR, countries=None, products=None):
+    forecasts_path = os.path.join(output_dir, FORECASTS_FILE)
+    metrics_path = os.path.join(output_dir, METRICS_FILE)
+    if not (os.path.exists(forecasts_path) and os.path.exists(metrics_path)):
+        return None, None
+
+    filters = []
+    if countries is not None:
+        filters.append((COUNTRY_COL, "in", list(countries)))
+    if products is not None:
+        filters.append((PRODUCT_COL, "in", list(products)))
+
+    forecasts = pd.read_parquet(forecasts_path, engine="pyarrow", filters=filters or None)
+    metrics = pd.read_parquet(metrics_path, engine="pyarrow", filters=filters or None)
+    return forecasts, metrics
+
+# ---------------------------------------------
+# 🖥️ Command line entry point
+# ---------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast every Country x Product Group demand series.")
+    parser.add_argument("--backend", default="sheets", choices=["sheets", "file", "sqlite"],
+                        help="Storage backend to read shipments from (default: sheets)")
+    parser.add_argument("--path", help="Data file for the file/sqlite backends")
+    parser.add_argument("--seed-path", help="CSV/Parquet file to seed an empty sqlite backend from")
+    parser.add_argument("--output", default=BATCH_RESULTS_DIR, help="Directory for the Parquet results")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT_SECONDS, help="Per-series fit timeout in seconds")
+    parser.add_argument("--min-points", type=int, default=DEFAULT_MIN_POINTS, help="Minimum weekly points per series")
+    parser.add_argument("--auto-order", action="store_true", help="Select SARIMA orders per series by AIC")
+    args = parser.parse_args(argv)
+    if args.path and args.backend == "sheets":
+        parser.error("--path applies only to the file and sqlite backends")
+    if args.seed_path and args.backend != "sqlite":
+        parser.error("--seed-path applies only to the sqlite backend")
+
+    from utils.storage_backends import get_backend
+    kwargs = {"path": args.path} if args.path else {}
+    if args.seed_path:
+        kwargs["seed_path"] = args.seed_path
+    backend = get_backend(args.backend, **kwargs)
+    df, _ = backend.load()
+
+    start = time.perf_counter()
+    forecasts, metrics = run_batch_forecast(
+        df, args.output, workers=args.workers, timeout=args.timeout, min_points=args.min_points, auto_order=args.auto_order,
+        progress_callback=lambda done, total: print(f"\r{done}/{total} series", end="", flush=True)
+    )
+    print()
+    print(metrics["status"].value_counts().to_string() if len(metrics) else "No series to forecast")
+    print(f"Wrote {len(forecasts)} forecast rows to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import pandas as pd
+from utils.date_parsing import DATE_COLUMNS, parse_date_columns
+from utils.freight_utils import FREIGHT_COL, WEIGHT_COL, resolve_freight_and_weight
+
+COLUMNAR_PATH = os.path.join(".cache", "scms_delivery_history.parquet")
+
+FLOAT_COLUMNS = [
+    "Weight (Kilograms)",
+    "Freight Cost (USD)",
+    "Line Item Insurance (USD)",
+    "Line Item Value",
+    "Pack Price",
+    "Unit Price",
+]
+CATEGORICAL_COLUMNS = [
+    "Country",
+    "Vendor",
+    "Product Group",
+    "Shipment Mode",
+    "Sub Classification",
+    "Dosage Form",
+    "Managed By",
+    "Fulfill Via",
+    "Vendor INCO Term",
+    "First Line Designation",
+]
+
+# ---------------------------------------------
+# 🧱 Typed columnar layout
+# ---------------------------------------------
+def to_columnar_frame(df, resolve_references=True, reference_tables=None):
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+
+    df = parse_date_columns(df)
+    # Without resolving, freight and weight keep their "See ASN-.." text for
+    # the caller to resolve once every row is available
+    skipped = set()
+    if resolve_references:
+        df, _ = resolve_freight_and_weight(df, reference_tables)
+    else:
+        skipped = {FREIGHT_COL, WEIGHT_COL}
+
+    for col in FLOAT_COLUMNS:
+        if col in df.columns and col not in skipped:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    # Sheets rows come back numericised per cell, so a text column can hold
+    # both ints and strings, which Parquet cannot store in one column
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    return df
+
+# ---------------------------------------------
+# 💾 Write snapshots
+# ---------------------------------------------
+def write_columnar_snapshot(df, path=COLUMNAR_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    df = to_columnar_frame(df)
+    df.to_parquet(path + ".tmp", engine="pyarrow", index=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def ingest_csv_to_columnar(csv_path, path=COLUMNAR_PATH):
+    from utils.data_loader import stream_csv_to_columnar
+
+    path, _ = stream_csv_to_columnar(csv_path, path)
+    return path
+
+
+def ingest_sheets_to_columnar(path=COLUMNAR_PATH):
+    from utils.google_sheets_loader import load_data_from_sheets
+
+    df, _ = load_data_from_sheets(cached=True)
+    return write_columnar_snapshot(df, path)
+
+# ---------------------------------------------
+# 🔎 Read with column projection and predicate pushdown
+# ---------------------------------------------
+# filters maps a column to either a list of allowed values or a
+# (start, end) tuple; None on either side of the tuple leaves it open.
+def _build_filters(filters):
+    predicates = []
+    for col, value in (filters or {}).items():
+        if isinstance(value, tuple):
+            start, end = value
+            if start is not None:
+                predicates.append((col, ">=", pd.Timestamp(start) if col in DATE_COLUMNS else start))
+            if end is not None:
+                predicates.append((col, "<=", pd.Timestamp(end) if col in DATE_COLUMNS else end))
+        else:
+            predicates.append((col, "in", list(value)))
+    return predicates or None
+
+
+def load_columnar_snapshot(path=COLUMNAR_PATH, columns=None, filters=None):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Columnar snapshot not found at '{path}'")
+
+    df = pd.read_parquet(path, engine="pyarrow", columns=columns, filters=_build_filters(filters))
+    date_columns = [col for col in DATE_COLUMNS if col in df.columns]
+    return df, date_columns
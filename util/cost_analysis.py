@@ -1,71 +1,9 @@
 import pandas as pd
 import numpy as np
-import re
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from sklearn.metrics import mean_absolute_error, mean_squared_error
-
-def clean_freight_cost_column_with_id_priority(df):
-    df = df.copy()
-
-    # Create lookup dictionaries
-    id_lookup = {}
-    asn_lookup = {}
-
-    if "ID" in df.columns and "Freight Cost (USD)" in df.columns:
-        temp_id = df[["ID", "Freight Cost (USD)"]].dropna()
-        temp_id = temp_id[temp_id["Freight Cost (USD)"].apply(lambda x: isinstance(x, (int, float, np.number)))]
-        id_lookup = dict(zip(temp_id["ID"], temp_id["Freight Cost (USD)"]))
-
-    if "ASN/DN #" in df.columns and "Freight Cost (USD)" in df.columns:
-        temp_asn = df[["ASN/DN #", "Freight Cost (USD)"]].dropna()
-        temp_asn["ASN/DN #"] = temp_asn["ASN/DN #"].astype(str)
-        temp_asn = temp_asn[temp_asn["Freight Cost (USD)"].apply(lambda x: isinstance(x, (int, float, np.number)))]
-        asn_lookup = dict(zip(temp_asn["ASN/DN #"], temp_asn["Freight Cost (USD)"]))
-
-    def process_freight(x):
-        if pd.isnull(x):
-            return np.nan
-        elif isinstance(x, (int, float, np.number)):
-            return x
-        elif isinstance(x, str):
-            x_lower = x.lower()
-            if "freight included" in x_lower:
-                return 0
-            elif "invoiced separately" in x_lower:
-                return np.nan
-            elif "see asn" in x_lower:
-                id_match = re.search(r"id#[:\s]*(\d+)", x_lower)
-                asn_match = re.search(r"(asn-\d+)", x_lower)
-
-                # Priority 1: Try to find using ID
-                if id_match:
-                    id_number = int(id_match.group(1))
-                    if id_number in id_lookup:
-                        return id_lookup[id_number]
-
-                # Priority 2: Try to find using ASN
-                if asn_match:
-                    asn_number = asn_match.group(1).upper()
-                    if asn_number in asn_lookup:
-                        return asn_lookup[asn_number]
-
-                return np.nan  # if neither found
-            else:
-                try:
-                    return float(x)
-                except:
-                    return np.nan
-        else:
-            return np.nan
-
-    df["Freight Cost (USD)"] = df["Freight Cost (USD)"].apply(process_freight)
-
-    # Finally fill remaining missing values
-    if df["Freight Cost (USD)"].isnull().sum() > 0:
-        median_value = df["Freight Cost (USD)"].median()
-        df["Freight Cost (USD)"].fillna(median_value, inplace=True)
-
-    return df
+from utils.date_parsing import ensure_datetime
+from utils.freight_utils import clean_freight_cost_column_with_id_priority
 
 def preprocess_dataframe_for_forecast(df):
     df = df.copy()
@@ -104,7 +42,7 @@ def preprocess_dataframe_for_forecast(df):
 def prepare_timeseries_data(df, date_col="Delivered to Client Date"):
     df = preprocess_dataframe_for_forecast(df)
 
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+    df[date_col] = ensure_datetime(df[date_col])
     df = df.dropna(subset=[date_col, "Unit Price"])
     df = df.set_index(date_col)
 
@@ -1,36 +1,182 @@
+import os
+import time
 import pandas as pd
-import chardet
+from chardet.universaldetector import UniversalDetector
+from utils.columnar_store import COLUMNAR_PATH, to_columnar_frame
+from utils.date_parsing import DATE_COLUMNS, parse_date_columns
+from utils.freight_utils import (
+    FREIGHT_COL, WEIGHT_COL, resolve_freight_and_weight, build_reference_tables, merge_reference_tables
+)
 
+ENCODING_SAMPLE_BYTES = 64 * 1024
+DEFAULT_CHUNKSIZE = 50_000
 
-def load_data(file_path):
+
+def detect_encoding(file_path, sample_bytes=ENCODING_SAMPLE_BYTES):
+    # Sample the head, middle and tail of the file instead of reading every byte
+    size = os.path.getsize(file_path)
+    detector = UniversalDetector()
     with open(file_path, 'rb') as f:
-        raw_data = f.read()
-        detected_encoding = chardet.detect(raw_data)['encoding']
+        for offset in sorted({0, max(0, size // 2 - sample_bytes // 2), max(0, size - sample_bytes)}):
+            f.seek(offset)
+            detector.feed(f.read(sample_bytes))
+            if detector.done:
+                break
+    detector.close()
 
-    df = pd.read_csv(file_path, encoding=detected_encoding, encoding_errors='replace')
+    encoding = detector.result['encoding'] or 'utf-8'
+    # An ASCII-only sample says nothing about the rest of the file
+    return 'utf-8' if encoding == 'ascii' else encoding
 
-    df["Weight (Kilograms)"] = pd.to_numeric(df["Weight (Kilograms)"], errors="coerce")
-    df["Freight Cost (USD)"] = pd.to_numeric(df["Freight Cost (USD)"], errors="coerce")
-
-    date_columns = [
-        "PQ First Sent to Client Date",
-        "PO Sent to Vendor Date",
-        "Scheduled Delivery Date",
-        "Delivered to Client Date",
-        "Delivery Recorded Date",
-    ]
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
+
+def _coerce_chunk(df, resolve_references=True, reference_tables=None):
+    if resolve_references:
+        df, _ = resolve_freight_and_weight(df, reference_tables)
+
+    df = parse_date_columns(df)
 
     categorical_cols = ["Shipment Mode", "Dosage"]
     for col in categorical_cols:
         if col in df.columns:
             df[col] = df[col].fillna("Unknown")
 
+    return df
+
+
+def _fill_numeric_medians(df):
     numerical_cols = ["Line Item Insurance (USD)"]
     for col in numerical_cols:
         if col in df.columns:
             df[col] = df[col].fillna(df[col].median())
+    return df
+
+
+def load_data(file_path):
+    detected_encoding = detect_encoding(file_path)
+
+    df = pd.read_csv(file_path, encoding=detected_encoding, encoding_errors='replace')
+    df = _fill_numeric_medians(_coerce_chunk(df))
+
+    return df, DATE_COLUMNS
+
+# ---------------------------------------------
+# 🌊 Chunked streaming ingestion
+# ---------------------------------------------
+# "See ASN-.. (ID#:..)" freight and weight values may point at a row in any
+# chunk. Chunks are therefore either left unresolved for the caller to resolve
+# on the whole frame, or resolved against lookup tables built from every row.
+def _iter_chunks(file_path, chunksize, stats, resolve_references=True, reference_tables=None):
+    encoding = detect_encoding(file_path)
+    stats.update({"encoding": encoding, "rows": 0, "chunks": 0})
+    start = time.perf_counter()
+
+    reader = pd.read_csv(file_path, encoding=encoding, encoding_errors='replace', chunksize=chunksize)
+    for chunk in reader:
+        chunk = to_columnar_frame(_coerce_chunk(chunk, resolve_references, reference_tables),
+                                  resolve_references, reference_tables)
+        stats["rows"] += len(chunk)
+        stats["chunks"] += 1
+        yield chunk
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else None
+
+
+def _concat_chunks(chunks):
+    if not chunks:
+        return pd.DataFrame()
+
+    # Per-chunk categoricals have different categories; union them so the
+    # concatenated columns stay categorical instead of falling back to object
+    categories = {}
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            categories[col] = pd.api.types.union_categoricals([chunk[col] for chunk in chunks]).categories
+
+    for chunk in chunks:
+        for col, cats in categories.items():
+            chunk[col] = chunk[col].cat.set_categories(cats)
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def load_data_streaming(file_path, chunksize=DEFAULT_CHUNKSIZE):
+    stats = {}
+    chunks = list(_iter_chunks(file_path, chunksize, stats, resolve_references=False))
+
+    # References are resolved once on the whole frame, so the result does not depend on the chunk size
+    df, _ = resolve_freight_and_weight(_concat_chunks(chunks))
+    for col in (FREIGHT_COL, WEIGHT_COL):
+        if col in df.columns:
+            df[col] = df[col].astype("float64")
+    df = _fill_numeric_medians(df)
+    return df, DATE_COLUMNS, stats
+
+
+def _scan_reference_tables(file_path, chunksize):
+    # Light first pass over the reference keys and values only
+    encoding = detect_encoding(file_path)
+    wanted = {"ID", "ASN/DN #", FREIGHT_COL, WEIGHT_COL}
+    reader = pd.read_csv(file_path, encoding=encoding, encoding_errors='replace', chunksize=chunksize,
+                         usecols=lambda col: col.strip() in wanted)
+    parts = []
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        parts.append(build_reference_tables(chunk))
+    return merge_reference_tables(parts)
+
+
+def _arrow_schema(chunk):
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            # Column was empty in the first chunk; later chunks may hold text
+            schema = schema.set(i, field.with_type(pa.large_string()))
+        elif pa.types.is_dictionary(field.type):
+            # The first chunk may fit its codes in int8; later ones may not
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), field.type.value_type)))
+    return schema
+
+
+def _align_to_schema(chunk, schema):
+    import pyarrow as pa
+
+    for field in schema:
+        if field.name not in chunk.columns:
+            continue
+        if (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)) \
+                and not pd.api.types.is_string_dtype(chunk[field.name]):
+            chunk[field.name] = chunk[field.name].where(chunk[field.name].isna(), chunk[field.name].astype(str))
+    return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def stream_csv_to_columnar(file_path, path=COLUMNAR_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    import pyarrow.parquet as pq
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Each chunk is written as its own row group, so only one chunk is held in
+    # memory. Insurance medians need the whole column and are left to readers;
+    # freight/weight references resolve against lookups from a first light pass.
+    reference_tables = _scan_reference_tables(file_path, chunksize)
+    stats = {}
+    writer = None
+    try:
+        for chunk in _iter_chunks(file_path, chunksize, stats, reference_tables=reference_tables):
+            if writer is None:
+                schema = _arrow_schema(chunk)
+                writer = pq.ParquetWriter(path + ".tmp", schema)
+            writer.write_table(_align_to_schema(chunk, schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError(f"No rows found in '{file_path}'")
 
-    return df, date_columns
+    os.replace(path + ".tmp", path)
+    return path, stats
@@ -0,0 +1,137 @@
+import numbers
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+
+DATE_COLUMNS = [
+    "PQ First Sent to Client Date",
+    "PO Sent to Vendor Date",
+    "Scheduled Delivery Date",
+    "Delivered to Client Date",
+    "Delivery Recorded Date",
+]
+
+# SCMS exports use "2-Jun-06" for delivery dates and "9/11/14" for PQ/PO
+# dates; the data entry tab writes ISO dates and SQLite round-trips them
+# with a time part. Sheets may render US dates with a four-digit year.
+DATE_FORMATS = ["%d-%b-%y", "%m/%d/%y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%m/%d/%Y"]
+
+SENTINELS = {
+    "date not captured": "Date Not Captured",
+    "pre-pq process": "Pre-PQ Process",
+    "n/a - from rdc": "From RDC",
+    "n/a": "Not Applicable",
+}
+STATUS_RECORDED = "Recorded"
+STATUS_MISSING = "Missing"
+STATUS_UNPARSEABLE = "Unparseable"
+
+# Sheets and Excel store dates as days since 1899-12-30 when a cell is read
+# unformatted; serials outside 1950-2100 are not dates
+SERIAL_DATE_EPOCH = pd.Timestamp("1899-12-30")
+SERIAL_DATE_RANGE = (18264, 73051)
+
+MAX_CACHE_ENTRIES = 200_000
+
+_cache_lock = threading.Lock()
+_parse_cache = {}
+
+
+def status_column(col):
+    return f"{col} Status"
+
+# ---------------------------------------------
+# 🗓️ Cached parsing of unique date strings
+# ---------------------------------------------
+def _parse_uncached(values):
+    parsed = {}
+    remaining = []
+    for value in values:
+        if isinstance(value, (pd.Timestamp, datetime.date)):
+            parsed[value] = (pd.Timestamp(value), STATUS_RECORDED)
+        elif isinstance(value, str) and value.strip().lower() in SENTINELS:
+            parsed[value] = (pd.NaT, SENTINELS[value.strip().lower()])
+        elif isinstance(value, str) and not value.strip():
+            parsed[value] = (pd.NaT, STATUS_MISSING)
+        elif isinstance(value, numbers.Number):
+            # to_datetime would read a bare number as an offset from 1970
+            parsed[value] = _parse_serial(value)
+        else:
+            remaining.append(value)
+
+    for fmt in DATE_FORMATS:
+        if not remaining:
+            break
+        results = pd.to_datetime(pd.Series(remaining, dtype=object).astype(str).str.strip(), format=fmt, errors="coerce")
+        still_remaining = []
+        for value, result in zip(remaining, results):
+            if pd.isna(result):
+                still_remaining.append(value)
+            else:
+                parsed[value] = (result, STATUS_RECORDED)
+        remaining = still_remaining
+
+    # Anything left is genuinely irregular; infer it one value at a time
+    for value in remaining:
+        try:
+            result = pd.to_datetime(value, errors="coerce")
+        except (TypeError, ValueError):
+            result = pd.NaT
+        parsed[value] = (result, STATUS_UNPARSEABLE if pd.isna(result) else STATUS_RECORDED)
+
+    return parsed
+
+
+def _parse_serial(value):
+    if isinstance(value, bool) or not SERIAL_DATE_RANGE[0] <= value <= SERIAL_DATE_RANGE[1]:
+        return pd.NaT, STATUS_UNPARSEABLE
+    return (SERIAL_DATE_EPOCH + pd.Timedelta(days=int(value))).normalize(), STATUS_RECORDED
+
+
+def _lookup(uniques):
+    with _cache_lock:
+        missing = [value for value in uniques if value not in _parse_cache]
+
+    if missing:
+        parsed = _parse_uncached(missing)
+        with _cache_lock:
+            if len(_parse_cache) + len(parsed) > MAX_CACHE_ENTRIES:
+                _parse_cache.clear()
+            _parse_cache.update(parsed)
+    else:
+        parsed = {}
+
+    with _cache_lock:
+        return [parsed[value] if value in parsed else _parse_cache[value] for value in uniques]
+
+
+def parse_date_series(series):
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    results = _lookup(list(uniques))
+
+    # The extra trailing slot is what factorize's -1 (missing) code indexes
+    dates = pd.DatetimeIndex([date for date, _ in results] + [pd.NaT]).values
+    statuses = np.array([status for _, status in results] + [STATUS_MISSING], dtype=object)
+
+    parsed = pd.Series(dates[codes], index=series.index, name=series.name)
+    status = pd.Series(pd.Categorical(statuses[codes]), index=series.index)
+    return parsed, status
+
+
+def ensure_datetime(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    parsed, _ = parse_date_series(series)
+    return parsed
+
+
+def parse_date_columns(df, columns=DATE_COLUMNS, add_status=True):
+    for col in columns:
+        if col not in df.columns or pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        parsed, status = parse_date_series(df[col])
+        df[col] = parsed
+        if add_status:
+            df[status_column(col)] = status
+    return df
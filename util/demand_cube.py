@@ -0,0 +1,192 @@
+import copy
+import threading
+import numpy as np
+import pandas as pd
+from utils.date_parsing import ensure_datetime
+from utils.derived_data import dataset_fingerprint
+
+DATE_COL = "Delivered to Client Date"
+QUANTITY_COL = "Line Item Quantity"
+COUNTRY_COL = "Country"
+PRODUCT_COL = "Product Group"
+SOURCE_COLUMNS = [COUNTRY_COL, PRODUCT_COL, DATE_COL, QUANTITY_COL]
+
+_cube_lock = threading.Lock()
+_cube_cache = {"fingerprint": None, "cube": None}
+
+
+def _week_ending(dates):
+    # Label each delivery with the Sunday that closes its week, like resample("W")
+    dates = dates.dt.normalize()
+    return dates + pd.to_timedelta((6 - dates.dt.dayofweek) % 7, unit="D")
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df[SOURCE_COLUMNS], index=False).to_numpy()
+
+# ---------------------------------------------
+# 🧊 Country × Product Group × week quantity cube
+# ---------------------------------------------
+# Outliers are screened per cell with the same rule forecast_sales applies
+# (drop quantities outside [Q1 - 1.5 IQR, Q3 + 3 IQR] only when they are
+# under 10% of the rows), so any selection is a plain sum of cell slices.
+class DemandCube:
+    def __init__(self):
+        self.countries = []
+        self.products = []
+        self.weeks = pd.DatetimeIndex([])
+        self.raw = np.zeros((0, 0, 0))
+        self.filtered = np.zeros((0, 0, 0))
+        self.stats = {}
+        self.source_rows = 0
+        self._row_hashes = np.array([], dtype=np.uint64)
+        self._rows = {"c": np.array([], dtype=np.int64), "p": np.array([], dtype=np.int64),
+                      "w": np.array([], dtype=np.int64), "q": np.array([], dtype=np.float64)}
+
+    @classmethod
+    def from_dataframe(cls, df):
+        cube = cls()
+        cube.append(df)
+        return cube
+
+    def _codes(self, values, labels):
+        index = {label: i for i, label in enumerate(labels)}
+        for value in dict.fromkeys(values):
+            if value not in index:
+                index[value] = len(labels)
+                labels.append(value)
+        return np.array([index[value] for value in values], dtype=np.int64)
+
+    def append(self, df):
+        self.source_rows += len(df)
+        self._row_hashes = np.concatenate([self._row_hashes, _row_hashes(df)])
+
+        rows = df[SOURCE_COLUMNS].copy()
+        rows[DATE_COL] = ensure_datetime(rows[DATE_COL])
+        rows[QUANTITY_COL] = pd.to_numeric(rows[QUANTITY_COL], errors="coerce")
+        rows = rows.dropna()
+        if rows.empty:
+            return self
+
+        week_ends = _week_ending(rows[DATE_COL])
+        bounds = [week_ends.min(), week_ends.max()]
+        if len(self.weeks):
+            bounds += [self.weeks[0], self.weeks[-1]]
+        new_weeks = pd.date_range(min(bounds), max(bounds), freq="W")
+
+        # Re-base existing week positions when the axis grows at the front
+        shift = new_weeks.get_loc(self.weeks[0]) if len(self.weeks) else 0
+        self._rows["w"] = self._rows["w"] + shift
+        self.weeks = new_weeks
+
+        c = self._codes(rows[COUNTRY_COL].astype(str).tolist(), self.countries)
+        p = self._codes(rows[PRODUCT_COL].astype(str).tolist(), self.products)
+        w = self.weeks.get_indexer(week_ends)
+        q = rows[QUANTITY_COL].to_numpy(dtype=np.float64)
+
+        for key, values in zip("cpwq", (c, p, w, q)):
+            self._rows[key] = np.concatenate([self._rows[key], values])
+
+        shape = (len(self.countries), len(self.products), len(self.weeks))
+        self.raw = self._resize(self.raw, shape, shift)
+        self.filtered = self._resize(self.filtered, shape, shift)
+
+        # Only cells that received rows need their slices and outlier stats rebuilt
+        touched = set(zip(c.tolist(), p.tolist()))
+        self._rebuild_cells(touched)
+        return self
+
+    def _resize(self, array, shape, shift):
+        resized = np.zeros(shape)
+        old_c, old_p, old_w = array.shape
+        resized[:old_c, :old_p, shift:shift + old_w] = array
+        return resized
+
+    def _rebuild_cells(self, cells):
+        cell_ids = self._rows["c"] * len(self.products) + self._rows["p"]
+        order = np.argsort(cell_ids, kind="stable")
+        sorted_ids = cell_ids[order]
+
+        for ci, pi in cells:
+            cell_id = ci * len(self.products) + pi
+            start, end = np.searchsorted(sorted_ids, [cell_id, cell_id + 1])
+            members = order[start:end]
+            weeks = self._rows["w"][members]
+            quantities = self._rows["q"][members]
+
+            q1, q3 = np.percentile(quantities, [25, 75])
+            iqr = q3 - q1
+            lower, upper = max(0, q1 - 1.5 * iqr), q3 + 3.0 * iqr
+            outliers = (quantities < lower) | (quantities > upper)
+            screened = outliers.sum() < 0.1 * len(quantities)
+            keep = ~outliers if screened else np.ones(len(quantities), dtype=bool)
+
+            self.raw[ci, pi] = np.bincount(weeks, weights=quantities, minlength=len(self.weeks))
+            self.filtered[ci, pi] = np.bincount(weeks[keep], weights=quantities[keep], minlength=len(self.weeks))
+            self.stats[(ci, pi)] = {
+                "rows": int(len(quantities)), "q1": float(q1), "q3": float(q3),
+                "lower_bound": float(lower), "upper_bound": float(upper),
+                "outliers": int(outliers.sum()), "outliers_removed": int(outliers.sum()) if screened else 0,
+            }
+
+    # ---------------------------------------------
+    # 🔎 Query
+    # ---------------------------------------------
+    def _selection(self, countries, products):
+        country_mask = np.isin(np.array(self.countries, dtype=object), [str(c) for c in countries])
+        product_mask = np.isin(np.array(self.products, dtype=object), [str(p) for p in products])
+        return country_mask, product_mask
+
+    def sales_data(self, countries, products, filtered=True):
+        country_mask, product_mask = self._selection(countries, products)
+        cube = self.filtered if filtered else self.raw
+        totals = cube[country_mask][:, product_mask].sum(axis=(0, 1)) if len(self.weeks) else np.array([])
+
+        nonzero = np.flatnonzero(totals)
+        if not len(nonzero):
+            return pd.Series(dtype=float, name=QUANTITY_COL)
+
+        span = slice(nonzero[0], nonzero[-1] + 1)
+        return pd.Series(totals[span], index=self.weeks[span], name=QUANTITY_COL)
+
+    def selection_stats(self, countries, products):
+        country_mask, product_mask = self._selection(countries, products)
+        selected = [
+            stats for (ci, pi), stats in self.stats.items()
+            if country_mask[ci] and product_mask[pi]
+        ]
+        return {
+            "filtered_rows": sum(s["rows"] for s in selected),
+            "cells": len(selected),
+            "outliers_removed": sum(s["outliers_removed"] for s in selected),
+        }
+
+    def cell_stats(self):
+        records = [
+            {COUNTRY_COL: self.countries[ci], PRODUCT_COL: self.products[pi], **stats}
+            for (ci, pi), stats in self.stats.items()
+        ]
+        return pd.DataFrame(records)
+
+
+def get_demand_cube(df):
+    fingerprint = dataset_fingerprint(df)
+
+    with _cube_lock:
+        cube = _cube_cache["cube"]
+        if cube is not None and _cube_cache["fingerprint"] == fingerprint:
+            return cube
+
+        # Rows appended to an unchanged prefix only extend the existing cube
+        if cube is not None and len(df) > cube.source_rows:
+            prefix = df.iloc[:cube.source_rows]
+            if np.array_equal(_row_hashes(prefix), cube._row_hashes):
+                # Extend a copy so sessions reading the current cube never see a half-applied append
+                cube = copy.deepcopy(cube).append(df.iloc[cube.source_rows:])
+                _cube_cache["cube"] = cube
+                _cube_cache["fingerprint"] = fingerprint
+                return cube
+
+        cube = DemandCube.from_dataframe(df)
+        _cube_cache.update({"fingerprint": fingerprint, "cube": cube})
+        return cube
@@ -0,0 +1,332 @@
+import os
+import re
+import glob
+import threading
+import numpy as np
+import pandas as pd
+from utils.date_parsing import ensure_datetime
+from utils.derived_data import dataset_fingerprint
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_INDEX_DIR = os.path.join(".cache", "embeddings")
+MAX_INDEX_VERSIONS = 4
+# Bumped whenever row_texts changes, so indexes of the old texts are rebuilt
+ROW_TEXT_VERSION = 2
+ENCODE_BATCH_SIZE = 256
+
+TEXT_COLUMNS = ["Country", "Product Group", "Sub Classification", "Vendor", "Item Description",
+                "Dosage Form", "Shipment Mode", "Manufacturing Site"]
+FILTER_COLUMNS = ("Country", "Product Group", "Vendor")
+DATE_COL = "Delivered to Client Date"
+
+ROWS_PER_LIST = 256
+N_PROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_ROWS = 50000
+EXACT_SEARCH_ROWS = 20000
+DEFAULT_TOP_K = 25
+
+# First words too common to stand in for a whole vendor or country name
+GENERIC_TOKENS = {"the", "standard", "general", "global", "national", "international", "pharmacy", "scms",
+                  "south", "north", "east", "west", "central", "republic"}
+MIN_TOKEN_LENGTH = 4
+# Leading words that are also everyday English: only a capitalized mention
+# ("Action Medeor", "from Premier") names the vendor
+COMMON_WORD_TOKENS = {"access", "action", "human", "micro", "premier", "omega", "trinity", "swords", "strides"}
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+
+_index_lock = threading.Lock()
+_indexes = {}
+
+# ---------------------------------------------
+# 📝 Row text
+# ---------------------------------------------
+def row_texts(df):
+    # One short "column: value" line per shipment; numbers are left to the filters.
+    # Missing values become empty, not the string "nan" (object first, as a
+    # categorical cannot be filled with a value outside its categories)
+    columns = [c for c in TEXT_COLUMNS if c in df.columns]
+    text = pd.Series("", index=df.index)
+    for c in columns:
+        text = text + c + ": " + df[c].astype(object).fillna("").astype(str) + "; "
+    return text.tolist()
+
+
+# ---------------------------------------------
+# 🧭 Inverted-file (IVF) index
+# ---------------------------------------------
+# Unit-length row embeddings are partitioned by spherical k-means. A query
+# scores the centroids, then only the rows of its closest lists, so the work
+# per question grows with the list size rather than the dataset size.
+def _assign(X, centroids, batch=65536):
+    return np.concatenate([np.argmax(X[i:i + batch] @ centroids.T, axis=1) for i in range(0, len(X), batch)]) \
+        if len(X) else np.zeros(0, dtype=np.int64)
+
+
+def spherical_kmeans(X, k, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(X, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(X[order], starts[filled], axis=0)
+        # Empty lists restart from random rows
+        sums[~filled] = X[rng.choice(len(X), size=(~filled).sum())]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+    return centroids.astype(np.float32), _assign(X, centroids)
+
+
+class RowVectorIndex:
+    def __init__(self, embeddings, centroids, assignments, metadata):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.assignments = assignments
+        self.metadata = metadata
+
+        # Row ids grouped by list: list l holds order[offsets[l]:offsets[l + 1]]
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+
+    @classmethod
+    def build(cls, embeddings, metadata, rows_per_list=ROWS_PER_LIST):
+        n_lists = max(1, min(len(embeddings), int(np.ceil(len(embeddings) / rows_per_list))))
+        if not len(embeddings):
+            return cls(embeddings, embeddings[:0], np.zeros(0, dtype=np.int64), metadata)
+
+        # Centroids are learned on a sample; every row is then assigned once
+        sample = embeddings
+        if len(embeddings) > max(KMEANS_SAMPLE_ROWS, n_lists):
+            sample = embeddings[np.random.default_rng(0).choice(len(embeddings), size=max(KMEANS_SAMPLE_ROWS, n_lists), replace=False)]
+        centroids, _ = spherical_kmeans(sample, n_lists)
+        return cls(embeddings, centroids, _assign(embeddings, centroids), metadata)
+
+    def _candidates(self, query, mask, top_k, n_probe):
+        # Closest lists first; keep probing until enough rows pass the filters
+        lists = np.argsort(-(self.centroids @ query))
+        chosen, found = [], 0
+        for probed, l in enumerate(lists):
+            if probed >= n_probe and found >= top_k:
+                break
+            ids = self.order[self.offsets[l]:self.offsets[l + 1]]
+            if mask is not None:
+                ids = ids[mask[ids]]
+            chosen.append(ids)
+            found += len(ids)
+        return np.concatenate(chosen) if chosen else np.zeros(0, dtype=np.int64)
+
+    def search(self, query, top_k=DEFAULT_TOP_K, mask=None, n_probe=N_PROBE):
+        if mask is not None and mask.sum() <= EXACT_SEARCH_ROWS:
+            # A narrow filter leaves few rows: scoring them all is exact and cheap
+            candidates = np.flatnonzero(mask)
+        else:
+            candidates = self._candidates(query, mask, top_k, n_probe)
+        if not len(candidates):
+            return candidates, np.zeros(0, dtype=np.float32)
+
+        scores = self.embeddings[candidates] @ query
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+    def save(self, path):
+        arrays = {"embeddings": self.embeddings, "centroids": self.centroids, "assignments": self.assignments}
+        for c, (codes, categories) in self.metadata["codes"].items():
+            arrays[f"codes:{c}"] = codes
+            arrays[f"categories:{c}"] = np.asarray(categories, dtype=str)
+        arrays["dates"] = self.metadata["dates"]
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            codes = {key[6:]: (data[key], data[f"categories:{key[6:]}"].tolist()) for key in data.files if key.startswith("codes:")}
+            metadata = {"codes": codes, "dates": data["dates"]}
+            return cls(data["embeddings"], data["centroids"], data["assignments"], metadata)
+
+# ---------------------------------------------
+# 🔎 Metadata pre-filters
+# ---------------------------------------------
+def build_metadata(df):
+    codes = {}
+    for c in FILTER_COLUMNS:
+        if c in df.columns:
+            values, categories = pd.factorize(df[c].astype(str))
+            codes[c] = (values.astype(np.int32), categories.tolist())
+    dates = ensure_datetime(df[DATE_COL]) if DATE_COL in df.columns else pd.Series(pd.NaT, index=df.index)
+    return {"codes": codes, "dates": dates.to_numpy(dtype="datetime64[D]")}
+
+
+def _mentions(question, value):
+    # Short upper-case codes (ARV, ACT) must match exactly; names match case-insensitively
+    value = value.strip().rstrip(".")
+    if len(value) < 2:
+        return False
+    flags = 0 if len(value) <= 4 and value.isupper() else re.IGNORECASE
+    return re.search(rf"(?<!\w){re.escape(value)}(?!\w)", question, flags) is not None
+
+
+def _date_range(question):
+    months = [(int(y), i + 1) for word, y in re.findall(r"\b([A-Za-z]{3,9})\.?\s+(20\d\d)\b", question)
+              for i, name in enumerate(MONTHS) if name.startswith(word.lower())]
+    if months:
+        start, end = min(months), max(months)
+        return (pd.Timestamp(start[0], start[1], 1), pd.Timestamp(end[0], end[1], 1) + pd.offsets.MonthEnd(0))
+
+    years = [int(y) for y in re.findall(r"\b(20\d\d)\b", question)]
+    if years:
+        return (pd.Timestamp(min(years), 1, 1), pd.Timestamp(max(years), 12, 31))
+    return None
+
+
+def _leading_tokens(values):
+    # A multi-word value can also be named by its first word: "Aurobindo"
+    # stands for both "Aurobindo Pharma Limited" and "AUROBINDO PHARAM (SOUTH
+    # AFRICA)", "Abbott" for every Abbott entity
+    tokens = {}
+    for value in values:
+        words = value.split()
+        token = words[0].strip(".,()").lower() if len(words) > 1 else ""
+        if len(token) >= MIN_TOKEN_LENGTH and token not in GENERIC_TOKENS:
+            tokens[value] = token
+    return tokens
+
+
+def value_names(values):
+    # The name each value is mentioned by: its leading word when it has one,
+    # so the Aurobindo entities count as one name and Vietnam and Nigeria as two
+    tokens = _leading_tokens(values)
+    return {value: tokens.get(value, value.lower()) for value in values}
+
+
+def _mentions_token(question, token, shared):
+    # A leading word counts when it is capitalized mid-sentence, or when it is
+    # neither everyday English nor the leading word in more than one column
+    capitalized = False
+    for match in re.finditer(rf"(?<!\w){re.escape(token)}(?!\w)", question, re.IGNORECASE):
+        sentence_start = re.search(r"(^|[.?!]\s+)$", question[:match.start()]) is not None
+        capitalized |= match.group()[0].isupper() and not sentence_start
+        if capitalized or (token not in COMMON_WORD_TOKENS and token not in shared):
+            return True
+    return False
+
+
+def extract_filters(question, categories):
+    # categories maps a column to its distinct values. "What action should we
+    # take about late shipments from Aurobindo?" filters Vendor to the two
+    # Aurobindo entities, not to ACTION MEDEOR as well
+    column_tokens = {c: _leading_tokens(values) for c, values in categories.items()}
+    seen, shared = set(), set()
+    for tokens in column_tokens.values():
+        shared |= seen & set(tokens.values())
+        seen |= set(tokens.values())
+
+    filters = {}
+    for c, values in categories.items():
+        tokens = column_tokens[c]
+        mentioned = {token for token in set(tokens.values()) if _mentions_token(question, token, shared)}
+        matched = [value for value in values if _mentions(question, value) or tokens.get(value) in mentioned]
+        # "Air Charter" in the question also mentions "Air": keep the longer value
+        matched = [value for value in matched if not any(value != other and value in other for other in matched)]
+        if matched:
+            filters[c] = matched
+
+    date_range = _date_range(question)
+    if date_range:
+        filters["date_range"] = date_range
+    return filters
+
+
+def filter_mask(metadata, filters):
+    mask = None
+    for c, values in filters.items():
+        if c == "date_range":
+            dates = metadata["dates"]
+            start, end = (np.datetime64(d.date(), "D") for d in values)
+            column_mask = (dates >= start) & (dates <= end)
+        else:
+            codes, categories = metadata["codes"][c]
+            lookup = {value: code for code, value in enumerate(categories)}
+            column_mask = np.isin(codes, [lookup[v] for v in values if v in lookup])
+        mask = column_mask if mask is None else mask & column_mask
+    return mask
+
+# ---------------------------------------------
+# 💾 Per-dataset index on disk
+# ---------------------------------------------
+def _index_path(fingerprint, model_name, index_dir):
+    return os.path.join(index_dir, f"{fingerprint}-{model_name}-rows-v{ROW_TEXT_VERSION}.npz")
+
+
+def _write_index(path, index, index_dir):
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    index.save(tmp_path)
+    os.replace(tmp_path, path)
+
+    # Older dataset versions are dropped, newest first kept
+    paths = sorted(glob.glob(os.path.join(index_dir, "*.npz")), key=os.path.getmtime, reverse=True)
+    for old in paths[MAX_INDEX_VERSIONS:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def _encode(model, texts):
+    embeddings = model.encode(texts, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+
+def build_row_index(df, model):
+    return RowVectorIndex.build(_encode(model, row_texts(df)), build_metadata(df))
+
+
+def get_row_index(df, model, model_name=EMBEDDING_MODEL_NAME, index_dir=EMBEDDING_INDEX_DIR):
+    key = (dataset_fingerprint(df), model_name)
+    with _index_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            return index
+
+        path = _index_path(*key, index_dir)
+        try:
+            index = RowVectorIndex.load(path)
+            if len(index.embeddings) != len(df):
+                index = None
+        except (OSError, ValueError, KeyError):
+            index = None
+
+        if index is None:
+            index = build_row_index(df, model)
+            try:
+                _write_index(path, index, index_dir)
+            except OSError as e:
+                print(f"⚠️ Could not save embedding index: {e}")
+
+        _indexes.clear()
+        _indexes[key] = index
+        return index
+
+# ---------------------------------------------
+# 🔍 Query
+# ---------------------------------------------
+def search_records(df, question, model, top_k=DEFAULT_TOP_K, model_name=EMBEDDING_MODEL_NAME):
+    index = get_row_index(df, model, model_name)
+    filters = extract_filters(question, {c: categories for c, (_, categories) in index.metadata["codes"].items()})
+    mask = filter_mask(index.metadata, filters)
+
+    query = _encode(model, [question])[0]
+    rows, scores = index.search(query, top_k, mask)
+    records = df.iloc[rows].copy()
+    records.insert(0, "Relevance", np.round(scores, 3))
+    return records, filters
@@ -1,8 +1,9 @@
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.statespace.sarimax import SARIMAX
+from utils.model_cache import fit_sarimax
+from utils.order_selection import select_sarimax_order, DEFAULT_TIME_BUDGET_SECONDS, DEFAULT_WORKERS
 from statsmodels.tsa.stattools import adfuller
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from utils.date_parsing import ensure_datetime
 
 def improved_mean_absolute_percentage_error(y_true, y_pred):
     y_true, y_pred = np.array(y_true), np.array(y_pred)
@@ -58,7 +59,7 @@ def get_forecast_confidence_level(data_points, reliability_score=None):
         return "High", "green"
 
 # --- Forecast Function ---
-def forecast_sales(df, filter_col, filter_value, debug=False):
+def forecast_sales(df, filter_col, filter_value, debug=False, auto_order=False, time_budget=DEFAULT_TIME_BUDGET_SECONDS):
     debug_info = {}
 
     if filter_col not in df.columns:
@@ -71,7 +72,7 @@ def forecast_sales(df, filter_col, filter_value, debug=False):
     if "Delivered to Client Date" not in filtered_df.columns:
         return (None, None, {"error": "Missing 'Delivered to Client Date'"}, debug_info) if debug else (None, None, {"error": "Missing 'Delivered to Client Date'"})
 
-    filtered_df["Delivered to Client Date"] = pd.to_datetime(filtered_df["Delivered to Client Date"], errors='coerce')
+    filtered_df["Delivered to Client Date"] = ensure_datetime(filtered_df["Delivered to Client Date"])
     filtered_df.dropna(subset=["Delivered to Client Date"], inplace=True)
     debug_info['rows_after_date_cleaning'] = len(filtered_df)
 
@@ -89,8 +90,14 @@ def forecast_sales(df, filter_col, filter_value, debug=False):
         filtered_df = filtered_df[~outlier_mask]
         debug_info['outliers_removed'] = int(outlier_mask.sum())
 
-    sales_data = filtered_df.groupby("Delivered to Client Date")["Line Item Quantity"].sum()
-    sales_data = sales_data.asfreq('W').ffill().bfill().fillna(0)
+    # Weekly totals with empty weeks as zero demand, the same series the demand cube serves
+    sales_data = filtered_df.set_index("Delivered to Client Date")["Line Item Quantity"].resample('W').sum()
+
+    return forecast_demand_series(sales_data, debug=debug, debug_info=debug_info, auto_order=auto_order, time_budget=time_budget)
+
+# --- Fit and evaluate on a prepared weekly series ---
+def forecast_demand_series(sales_data, debug=False, debug_info=None, auto_order=False, time_budget=DEFAULT_TIME_BUDGET_SECONDS, workers=DEFAULT_WORKERS, method="sarimax"):
+    debug_info = {} if debug_info is None else debug_info
     debug_info['final_data_points'] = len(sales_data)
 
     if sales_data.empty or len(sales_data) < 5:
@@ -104,50 +111,79 @@ def forecast_sales(df, filter_col, filter_value, debug=False):
     except Exception:
         is_stationary = False
 
-    order = (1, 1, 1)
-    seasonal_order = (1, 1, 0, 12)
-    model_description = "Default SARIMA(1,1,1)(1,1,0,12)"
-
     train_size = int(len(sales_data) * 0.8)
     if len(sales_data) - train_size < 3:
         train_size = len(sales_data) - 3
     train_size = max(min(train_size, len(sales_data) - 1), 1)
 
+    fallback = None
+    if method == "sarimax":
+        try:
+            forecast, metrics = _sarimax_demand_forecast(sales_data, train_size, is_stationary, auto_order, time_budget, workers, debug_info)
+        except Exception as e:
+            # Short or sparse series can break the SARIMAX fit; the baselines always produce a forecast
+            fallback = f"SARIMAX failed ({e}); fell back to the baseline model"
+            debug_info['fallback'] = fallback
+            method = "auto"
+    if method != "sarimax":
+        forecast, metrics = _baseline_demand_forecast(sales_data, train_size, method)
+        if fallback:
+            metrics['fallback'] = fallback
+
+    if metrics['MAPE'] is not None:
+        metrics['forecast_accuracy'] = get_forecast_accuracy_description(metrics['MAPE'])
+    if metrics['R2'] is not None:
+        metrics['model_quality'] = get_model_quality_description(metrics['R2'])
+
+    confidence_level, confidence_color = get_forecast_confidence_level(len(sales_data), metrics.get('reliability_score'))
+    metrics['confidence'] = { 'level': confidence_level, 'color': confidence_color }
+
+    return (sales_data.to_frame(), forecast, metrics, debug_info) if debug else (sales_data.to_frame(), forecast, metrics)
+
+
+def _empty_metrics():
+    return {
+        'RMSE': None,
+        'MAE': None,
+        'MAPE': None,
+        'R2': None,
+        'reliability_score': None,
+        'note': "Test set too small to evaluate accuracy"
+    }
+
+
+def _sarimax_demand_forecast(sales_data, train_size, is_stationary, auto_order, time_budget, workers, debug_info):
+    order = (1, 1, 1)
+    seasonal_order = (1, 1, 0, 12)
+    model_description = "Default SARIMA(1,1,1)(1,1,0,12)"
+    selection = None
+
     train_data = sales_data.iloc[:train_size]
     test_data = sales_data.iloc[train_size:]
 
-    model = SARIMAX(train_data, order=order, seasonal_order=seasonal_order, enforce_stationarity=False, enforce_invertibility=False)
-    results = model.fit(disp=False, maxiter=200)
+    # Orders are chosen on the training window so the backtest stays out-of-sample
+    if auto_order:
+        try:
+            selection = select_sarimax_order(train_data, 12, is_stationary=is_stationary, time_budget=time_budget,
+                                             workers=workers, enforce_stationarity=False, enforce_invertibility=False)
+            order, seasonal_order = selection['order'], selection['seasonal_order']
+            model_description = selection['description']
+            debug_info['order_selection'] = selection
+        except ValueError as e:
+            debug_info['order_selection'] = f"Failed, using default: {e}"
+
+    results = fit_sarimax(train_data, order, seasonal_order, fit_kwargs={'maxiter': 200}, enforce_stationarity=False, enforce_invertibility=False)
 
-    metrics = {}
     if len(test_data) >= 3:
-        forecast_test = results.get_forecast(steps=len(test_data)).predicted_mean
-        forecast_test = np.maximum(forecast_test, 0)
-
-        rmse = np.sqrt(mean_squared_error(test_data, forecast_test))
-        mae = mean_absolute_error(test_data, forecast_test)
-        mape = improved_mean_absolute_percentage_error(test_data, forecast_test)
-        r2 = r2_score(test_data, forecast_test)
-
-        metrics = {
-            'RMSE': float(rmse),
-            'MAE': float(mae),
-            'MAPE': float(mape),
-            'R2': float(r2),
-            'reliability_score': calculate_reliability_score(mape, r2)
-        }
+        # Score 1-6 week forecasts from every test-period origin with the training fit
+        from utils.backtesting import rolling_origin_backtest
+        backtest = rolling_origin_backtest(results, sales_data, train_size, horizons=6, lower_bound=0)
+        metrics = dict(backtest['overall'])
+        metrics['backtest'] = backtest
     else:
-        metrics = {
-            'RMSE': None,
-            'MAE': None,
-            'MAPE': None,
-            'R2': None,
-            'reliability_score': None,
-            'note': "Test set too small to evaluate accuracy"
-        }
-
-    final_model = SARIMAX(sales_data, order=order, seasonal_order=seasonal_order, enforce_stationarity=False, enforce_invertibility=False)
-    final_results = final_model.fit(disp=False, maxiter=200)
+        metrics = _empty_metrics()
+
+    final_results = fit_sarimax(sales_data, order, seasonal_order, fit_kwargs={'maxiter': 200}, enforce_stationarity=False, enforce_invertibility=False)
     forecast = final_results.forecast(steps=6)
     forecast = np.maximum(forecast, 0)
     forecast = pd.Series(forecast, index=pd.date_range(sales_data.index[-1] + pd.Timedelta(weeks=1), periods=6, freq='W'))
@@ -157,13 +193,22 @@ def forecast_sales(df, filter_col, filter_value, debug=False):
         'seasonal_order': seasonal_order,
         'description': model_description
     }
+    if selection:
+        metrics['model_params']['selection'] = selection
+    return forecast, metrics
 
-    if metrics['MAPE'] is not None:
-        metrics['forecast_accuracy'] = get_forecast_accuracy_description(metrics['MAPE'])
-    if metrics['R2'] is not None:
-        metrics['model_quality'] = get_model_quality_description(metrics['R2'])
 
-    confidence_level, confidence_color = get_forecast_confidence_level(len(sales_data), metrics.get('reliability_score'))
-    metrics['confidence'] = { 'level': confidence_level, 'color': confidence_color }
+def _baseline_demand_forecast(sales_data, train_size, method):
+    # Imported here: the baseline engine's backtest helpers build on this module's metrics
+    from utils.baseline_forecasting import forecast_baseline_series, backtest_baseline, METHOD_LABELS
 
-    return (sales_data.to_frame(), forecast, metrics, debug_info) if debug else (sales_data.to_frame(), forecast, metrics)
+    if len(sales_data) - train_size >= 3:
+        backtest = backtest_baseline(sales_data, train_size, horizons=6, method=method, lower_bound=0)
+        metrics = dict(backtest['overall'])
+        metrics['backtest'] = backtest
+    else:
+        metrics = _empty_metrics()
+
+    forecast = forecast_baseline_series(sales_data, 6, method=method, lower_bound=0)
+    metrics['model_params'] = {'method': method, 'description': METHOD_LABELS[method]}
+    return forecast, metrics
@@ -1,62 +1,138 @@
 import pandas as pd
 import numpy as np
-import re
 
-def clean_freight_cost_column_with_id_priority(df):
+FREIGHT_COL = "Freight Cost (USD)"
+WEIGHT_COL = "Weight (Kilograms)"
+
+# Text markers per column: values that mean zero, values that mean "not
+# recorded here", and "See ASN-8 (ID#:1)" / "See DN-304 (ID#:10589)"
+# references to another shipment line that carries the real number.
+REFERENCE_RULES = {
+    FREIGHT_COL: {"zero": "freight included", "separate": "invoiced separately"},
+    WEIGHT_COL: {"zero": None, "separate": "captured separately"},
+}
+REFERENCE_PATTERN = r"see\s+(?:asn|dn)-\d+"
+ID_PATTERN = r"id#[:\s]*(\d+)"
+SHIPMENT_PATTERN = r"((?:asn|dn)-\d+)"
+
+# ---------------------------------------------
+# 🔗 Vectorized reference resolution
+# ---------------------------------------------
+def _lookup_table(keys, values):
+    table = pd.Series(values.to_numpy(), index=keys.to_numpy())
+    table = table[table.index.notna() & table.notna()]
+    # Later rows win on duplicate keys, matching the old dict(zip(...)) lookups
+    return table[~table.index.duplicated(keep="last")]
+
+
+def _column_tables(df, numeric):
+    tables = {"id": None, "shipment": None}
+    if "ID" in df.columns:
+        tables["id"] = _lookup_table(pd.to_numeric(df["ID"], errors="coerce"), numeric)
+    if "ASN/DN #" in df.columns:
+        tables["shipment"] = _lookup_table(df["ASN/DN #"].astype(str).str.upper(), numeric)
+    return tables
+
+
+def build_reference_tables(df):
+    # The ID and ASN/DN lookups a reference in another frame (or chunk) resolves against
+    return {
+        col: _column_tables(df, pd.to_numeric(df[col], errors="coerce").astype("float64"))
+        for col in (FREIGHT_COL, WEIGHT_COL) if col in df.columns
+    }
+
+
+def merge_reference_tables(parts):
+    # Parts in file order; later rows still win on duplicate keys
+    merged = {}
+    for tables in parts:
+        for col, lookups in tables.items():
+            for kind, table in lookups.items():
+                if table is not None:
+                    merged.setdefault(col, {}).setdefault(kind, []).append(table)
+
+    result = {}
+    for col, lookups in merged.items():
+        result[col] = {"id": None, "shipment": None}
+        for kind, tables in lookups.items():
+            table = pd.concat(tables)
+            result[col][kind] = table[~table.index.duplicated(keep="last")]
+    return result
+
+
+def _classify_text(values, rules):
+    # Reference strings repeat heavily, so the string work runs once per unique value
+    text = pd.Series(values, dtype=object).astype(str).str.lower()
+    classes = pd.DataFrame(index=text.index)
+    classes["zero"] = text.str.contains(rules["zero"], regex=False) if rules["zero"] else False
+    classes["separate"] = text.str.contains(rules["separate"], regex=False) if rules["separate"] else False
+    classes["reference"] = text.str.contains(REFERENCE_PATTERN, regex=True) & ~classes["zero"] & ~classes["separate"]
+    classes["id"] = pd.to_numeric(text.str.extract(ID_PATTERN, expand=False), errors="coerce")
+    classes["shipment"] = text.str.extract(SHIPMENT_PATTERN, expand=False).str.upper()
+    return classes
+
+
+def resolve_reference_column(df, col, reference_tables=None):
+    # reference_tables (from build_reference_tables) lets a chunk resolve
+    # references to rows outside it; by default only df's own rows are used
+    raw = df[col]
+    numeric = pd.to_numeric(raw, errors="coerce").astype("float64")
+    counts = {"numeric": int(numeric.notna().sum()), "missing": int(raw.isna().sum())}
+
+    # Work positionally so duplicate index labels cannot misplace values
+    positions = np.flatnonzero((raw.notna() & numeric.isna()).to_numpy())
+    rules = REFERENCE_RULES.get(col, {"zero": None, "separate": None})
+
+    codes, uniques = pd.factorize(raw.iloc[positions])
+    classes = _classify_text(uniques, rules).iloc[codes].reset_index(drop=True)
+
+    resolved = numeric.to_numpy().copy()
+    resolved[positions[classes["zero"].to_numpy()]] = 0.0
+    counts["included"] = int(classes["zero"].sum())
+    counts["separately"] = int(classes["separate"].sum())
+
+    references = classes[classes["reference"]]
+    counts["references"] = len(references)
+
+    tables = {"id": None, "shipment": None}
+    if len(references):
+        tables = reference_tables[col] if reference_tables and col in reference_tables else _column_tables(df, numeric)
+
+    by_id = pd.Series(np.nan, index=references.index)
+    if tables["id"] is not None:
+        by_id = references["id"].map(tables["id"])
+
+    by_shipment = pd.Series(np.nan, index=references.index)
+    if tables["shipment"] is not None:
+        by_shipment = references["shipment"].map(tables["shipment"])
+
+    # ID match has priority over the ASN/DN match
+    resolved[positions[references.index.to_numpy()]] = by_id.fillna(by_shipment).to_numpy()
+    counts["resolved_by_id"] = int(by_id.notna().sum())
+    counts["resolved_by_shipment"] = int((by_id.isna() & by_shipment.notna()).sum())
+    counts["unresolved_references"] = int((by_id.isna() & by_shipment.isna()).sum())
+    counts["unparseable"] = int((~classes["zero"] & ~classes["separate"] & ~classes["reference"]).sum())
+
+    return pd.Series(resolved, index=raw.index, name=col), counts
+
+
+def resolve_freight_and_weight(df, reference_tables=None):
     df = df.copy()
+    report = {}
+    for col in (FREIGHT_COL, WEIGHT_COL):
+        if col in df.columns:
+            df[col], report[col] = resolve_reference_column(df, col, reference_tables)
+    return df, report
+
+
+def clean_freight_cost_column_with_id_priority(df, return_report=False):
+    df = df.copy()
+
+    df[FREIGHT_COL], report = resolve_reference_column(df, FREIGHT_COL)
+
+    if df[FREIGHT_COL].isnull().sum() > 0:
+        median_value = df[FREIGHT_COL].median()
+        report["median_filled"] = int(df[FREIGHT_COL].isnull().sum())
+        df[FREIGHT_COL] = df[FREIGHT_COL].fillna(median_value)
 
-    id_lookup = {}
-    asn_lookup = {}
-
-    if "ID" in df.columns and "Freight Cost (USD)" in df.columns:
-        temp_id = df[["ID", "Freight Cost (USD)"]].dropna()
-        temp_id = temp_id[temp_id["Freight Cost (USD)"].apply(lambda x: isinstance(x, (int, float, np.number)))]
-        id_lookup = dict(zip(temp_id["ID"], temp_id["Freight Cost (USD)"]))
-
-    if "ASN/DN #" in df.columns and "Freight Cost (USD)" in df.columns:
-        temp_asn = df[["ASN/DN #", "Freight Cost (USD)"]].dropna()
-        temp_asn["ASN/DN #"] = temp_asn["ASN/DN #"].astype(str)
-        temp_asn = temp_asn[temp_asn["Freight Cost (USD)"].apply(lambda x: isinstance(x, (int, float, np.number)))]
-        asn_lookup = dict(zip(temp_asn["ASN/DN #"], temp_asn["Freight Cost (USD)"]))
-
-    def process_freight(x):
-        if pd.isnull(x):
-            return np.nan
-        elif isinstance(x, (int, float, np.number)):
-            return x
-        elif isinstance(x, str):
-            x_lower = x.lower()
-            if "freight included" in x_lower:
-                return 0
-            elif "invoiced separately" in x_lower:
-                return np.nan
-            elif "see asn" in x_lower:
-                id_match = re.search(r"id#[:\s]*(\d+)", x_lower)
-                asn_match = re.search(r"(asn-\d+)", x_lower)
-
-                if id_match:
-                    id_number = int(id_match.group(1))
-                    if id_number in id_lookup:
-                        return id_lookup[id_number]
-
-                if asn_match:
-                    asn_number = asn_match.group(1).upper()
-                    if asn_number in asn_lookup:
-                        return asn_lookup[asn_number]
-
-                return np.nan
-            else:
-                try:
-                    return float(x)
-                except:
-                    return np.nan
-        else:
-            return np.nan
-
-    df["Freight Cost (USD)"] = df["Freight Cost (USD)"].apply(process_freight)
-
-    if df["Freight Cost (USD)"].isnull().sum() > 0:
-        median_value = df["Freight Cost (USD)"].median()
-        df["Freight Cost (USD)"].fillna(median_value, inplace=True)
-
-    return df
+    return (df, report) if return_report else df
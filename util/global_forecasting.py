@@ -0,0 +1,340 @@
+import copy
+import time
+import threading
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from utils.date_parsing import ensure_datetime
+from utils.derived_data import dataset_fingerprint
+
+DATE_COL = "Delivered to Client Date"
+QUANTITY_COL = "Line Item Quantity"
+SERIES_KEYS = ("Country", "Product Group", "Vendor", "Shipment Mode")
+LAGS = (1, 2, 3, 4, 8, 13, 26, 52)
+ROLLING_WINDOWS = (4, 13, 26)
+HORIZON = 6
+MAX_TRAIN_WEEKS = 156
+MAX_CATEGORIES = 254
+HOLDOUT_WEEKS = 13
+
+_store_lock = threading.Lock()
+_forecaster_cache = {"fingerprint": None, "store": None, "model": None, "holdout_model": None}
+_build_lock = threading.Lock()
+_build = {"fingerprint": None, "thread": None}
+
+
+def _week_ending(dates):
+    dates = dates.dt.normalize()
+    return dates + pd.to_timedelta((6 - dates.dt.dayofweek) % 7, unit="D")
+
+
+def _row_hashes(df, columns):
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+# ---------------------------------------------
+# 🗄️ Incremental lag feature store
+# ---------------------------------------------
+# Holds one weekly quantity row per series plus running sums, so lag and
+# rolling-window features are column lookups. Appending shipments only adds
+# into the touched cells and recomputes the running sums of touched series.
+class LagFeatureStore:
+    def __init__(self, keys=SERIES_KEYS):
+        self.keys = tuple(keys)
+        self.labels = []
+        self._index = {}
+        self.weeks = pd.DatetimeIndex([])
+        self.values = np.zeros((0, 0))
+        self.first_week = np.zeros(0, dtype=np.int64)
+        self.source_rows = 0
+        self._row_hashes = np.array([], dtype=np.uint64)
+        self._sums = {}
+
+    @classmethod
+    def from_dataframe(cls, df, keys=SERIES_KEYS):
+        return cls(keys).append(df)
+
+    @property
+    def columns(self):
+        return list(self.keys) + [DATE_COL, QUANTITY_COL]
+
+    def append(self, df):
+        self.source_rows += len(df)
+        self._row_hashes = np.concatenate([self._row_hashes, _row_hashes(df, self.columns)])
+
+        rows = df[self.columns].copy()
+        rows[DATE_COL] = ensure_datetime(rows[DATE_COL])
+        rows[QUANTITY_COL] = pd.to_numeric(rows[QUANTITY_COL], errors="coerce")
+        rows = rows.dropna()
+        if rows.empty:
+            return self
+
+        week_ends = _week_ending(rows[DATE_COL])
+        bounds = [week_ends.min(), week_ends.max()] + ([self.weeks[0], self.weeks[-1]] if len(self.weeks) else [])
+        new_weeks = pd.date_range(min(bounds), max(bounds), freq="W")
+        shift = new_weeks.get_loc(self.weeks[0]) if len(self.weeks) else 0
+
+        labels = list(zip(*(rows[key].astype(str) for key in self.keys)))
+        for label in dict.fromkeys(labels):
+            if label not in self._index:
+                self._index[label] = len(self.labels)
+                self.labels.append(label)
+
+        values = np.full((len(self.labels), len(new_weeks)), np.nan)
+        values[:self.values.shape[0], shift:shift + self.values.shape[1]] = self.values
+        first_week = np.full(len(self.labels), len(new_weeks), dtype=np.int64)
+        first_week[:len(self.first_week)] = self.first_week + shift
+
+        s = np.array([self._index[label] for label in labels])
+        w = new_weeks.get_indexer(week_ends)
+        np.minimum.at(first_week, s, w)
+
+        # Weeks after a series' first delivery with no shipments are zero demand
+        started = np.arange(len(new_weeks))[np.newaxis, :] >= first_week[:, np.newaxis]
+        values = np.where(started & np.isnan(values), 0.0, values)
+        np.add.at(values, (s, w), rows[QUANTITY_COL].to_numpy(dtype=float))
+
+        # Rows inside the current week range only change the running sums of their own series
+        axis_changed = not new_weeks.equals(self.weeks)
+        self.values, self.first_week, self.weeks = values, first_week, new_weeks
+        self._update_sums(np.arange(len(self.labels)) if axis_changed else np.unique(s))
+        return self
+
+    def _update_sums(self, series):
+        # Running sums with a leading zero column: window sums are two lookups
+        block = self.values[series]
+        filled = np.nan_to_num(block)
+        fresh = {
+            "sum": np.cumsum(filled, axis=1),
+            "sq": np.cumsum(filled ** 2, axis=1),
+            "count": np.cumsum(~np.isnan(block), axis=1),
+            "nonzero": np.cumsum(filled > 0, axis=1),
+        }
+        n_series, n_weeks = self.values.shape
+        for name, cumulative in fresh.items():
+            sums = self._sums.get(name)
+            if sums is None or sums.shape != (n_series, n_weeks + 1):
+                grown = np.zeros((n_series, n_weeks + 1))
+                if sums is not None:
+                    grown[:sums.shape[0]] = sums
+                sums = grown
+            sums[series, 1:] = cumulative
+            self._sums[name] = sums
+
+    def _window(self, name, end, width):
+        # Sum over columns (end - width, end] for every series
+        sums = self._sums[name]
+        rows = np.arange(sums.shape[0])[:, np.newaxis]
+        return sums[rows, end + 1] - sums[rows, np.maximum(end + 1 - width, 0)]
+
+    # ---------------------------------------------
+    # 🧱 Design matrix
+    # ---------------------------------------------
+    def features(self, origins, horizons=range(1, HORIZON + 1), category_codes=None):
+        # One row per (series, origin, horizon) using only weeks up to the origin
+        n_series = len(self.labels)
+        origins = np.asarray(origins, dtype=np.int64)
+        grid_origin = np.broadcast_to(origins, (n_series, len(origins)))
+        series = np.broadcast_to(np.arange(n_series)[:, np.newaxis], grid_origin.shape)
+        live = grid_origin >= self.first_week[:, np.newaxis]
+
+        columns = {}
+        for lag in LAGS:
+            position = grid_origin - lag + 1
+            lagged = self.values[series, np.maximum(position, 0)]
+            columns[f"lag_{lag}"] = np.where(position >= 0, lagged, np.nan)
+
+        for width in ROLLING_WINDOWS:
+            count = self._window("count", grid_origin, width)
+            total = self._window("sum", grid_origin, width)
+            mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+            columns[f"roll_mean_{width}"] = mean
+            if width == 13:
+                squares = self._window("sq", grid_origin, width)
+                columns["roll_std_13"] = np.sqrt(np.maximum(squares / np.maximum(count, 1) - mean ** 2, 0))
+                columns["nonzero_share_13"] = self._window("nonzero", grid_origin, width) / np.maximum(count, 1)
+
+        columns["age_weeks"] = grid_origin - self.first_week[:, np.newaxis]
+        base = {name: values[live] for name, values in columns.items()}
+        series_ids, origin_ids = series[live], grid_origin[live]
+
+        codes = category_codes if category_codes is not None else self.category_codes()
+        frames = []
+        for horizon in horizons:
+            target_weeks = self.weeks[0] + pd.to_timedelta(7 * (origin_ids + horizon), unit="D")
+            frame = pd.DataFrame(base)
+            frame["horizon"] = horizon
+            frame["week_of_year"] = target_weeks.isocalendar().week.to_numpy(dtype=np.int64)
+            frame["month"] = target_weeks.month
+            for i, key in enumerate(self.keys):
+                frame[key] = codes[i][series_ids]
+            frame["_series"] = series_ids
+            frame["_origin"] = origin_ids
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+    def category_codes(self):
+        # Ordinal codes per key; rare values share one bucket so every key
+        # stays under the 255-category limit of the boosting model
+        codes = []
+        for i in range(len(self.keys)):
+            values = pd.Series([label[i] for label in self.labels])
+            keep = values.value_counts().index[:MAX_CATEGORIES]
+            mapping = {value: code for code, value in enumerate(keep)}
+            codes.append(values.map(mapping).fillna(MAX_CATEGORIES).to_numpy(dtype=np.int64))
+        return codes
+
+# ---------------------------------------------
+# 🌍 Global model
+# ---------------------------------------------
+class GlobalDemandModel:
+    def __init__(self, horizon=HORIZON, max_train_weeks=MAX_TRAIN_WEEKS, **params):
+        self.horizon = horizon
+        self.max_train_weeks = max_train_weeks
+        # Poisson suits zero-heavy weekly counts; small, well-populated leaves keep its log link from extrapolating wildly
+        self.params = {"loss": "poisson", "max_iter": 300, "learning_rate": 0.05, "max_leaf_nodes": 15,
+                       "min_samples_leaf": 200, "early_stopping": True, "random_state": 0, **params}
+        self.model = None
+        self.feature_names = None
+        self.info = {}
+
+    def fit(self, store, last_origin=None):
+        start = time.perf_counter()
+        last_origin = len(store.weeks) - 1 if last_origin is None else last_origin
+        origins = np.arange(max(last_origin - self.max_train_weeks, 0), last_origin)
+
+        training = store.features(origins, range(1, self.horizon + 1))
+        target_week = training["_origin"].to_numpy() + training["horizon"].to_numpy()
+        training = training[target_week <= last_origin]
+        target = store.values[training["_series"].to_numpy(), target_week[target_week <= last_origin]]
+
+        X = training.drop(columns=["_series", "_origin"])
+        self.feature_names = list(X.columns)
+        categorical = [name in store.keys for name in self.feature_names]
+        self.model = HistGradientBoostingRegressor(categorical_features=categorical, **self.params)
+        self.model.fit(X, target)
+
+        self.info = {"training_rows": len(X), "series": len(store.labels), "fit_seconds": round(time.perf_counter() - start, 2)}
+        return self
+
+    def _score(self, store, origin):
+        # Every series and every horizon in one vectorized predict call
+        rows = store.features([origin], range(1, self.horizon + 1))
+        return rows, self.model.predict(rows[self.feature_names])
+
+    def predict(self, store, origin=None):
+        origin = len(store.weeks) - 1 if origin is None else origin
+        rows, predictions = self._score(store, origin)
+
+        result = pd.DataFrame([store.labels[s] for s in rows["_series"]], columns=list(store.keys))
+        result["Week"] = store.weeks[0] + pd.to_timedelta(7 * (origin + rows["horizon"].to_numpy()), unit="D")
+        result["Forecast"] = predictions
+        return result
+
+def _holdout_forecasts(store, model, first_origin, last_week, series=None):
+    # 1..H forecasts from every origin whose targets fall on or before last_week,
+    # summed over the chosen series (all when None) like the per-selection models
+    records = []
+    for origin in range(first_origin, last_week):
+        rows, predictions = model._score(store, origin)
+        horizons, row_series = rows["horizon"].to_numpy(), rows["_series"].to_numpy()
+        valid = origin + horizons <= last_week
+        if series is not None:
+            valid &= np.isin(row_series, series)
+        actual = store.values[row_series[valid], (origin + horizons)[valid]]
+        frame = pd.DataFrame({"origin": store.weeks[origin], "horizon": horizons[valid],
+                              "actual": actual, "forecast": predictions[valid]})
+        records.append(frame.groupby(["origin", "horizon"], as_index=False)[["actual", "forecast"]].sum())
+    if not records:
+        return pd.DataFrame(columns=["origin", "horizon", "actual", "forecast"])
+    return pd.concat(records, ignore_index=True)
+
+# ---------------------------------------------
+# 🔁 Cached forecaster
+# ---------------------------------------------
+# Two fits per dataset version (~15 s each on the SCMS file): the forecasting
+# model on every week, and a holdout model with the last HOLDOUT_WEEKS hidden
+# that scores selections out of sample. start_global_forecaster runs them in
+# a background thread so the tab stays responsive while they train.
+def get_global_forecaster(df, fingerprint=None):
+    fingerprint = fingerprint or dataset_fingerprint(df)
+
+    with _store_lock:
+        store = _forecaster_cache["store"]
+        if store is not None and _forecaster_cache["fingerprint"] == fingerprint:
+            return store, _forecaster_cache["model"], _forecaster_cache["holdout_model"]
+
+        # Appended rows only extend the feature store; the models are retrained on it
+        if store is not None and len(df) > store.source_rows and np.array_equal(
+                _row_hashes(df.iloc[:store.source_rows], store.columns), store._row_hashes):
+            store = copy.deepcopy(store).append(df.iloc[store.source_rows:])
+        else:
+            store = LagFeatureStore.from_dataframe(df)
+
+        model = GlobalDemandModel().fit(store)
+        holdout_origin = len(store.weeks) - 1 - HOLDOUT_WEEKS
+        holdout_model = GlobalDemandModel().fit(store, last_origin=holdout_origin) if holdout_origin > 0 else None
+        _forecaster_cache.update({"fingerprint": fingerprint, "store": store, "model": model, "holdout_model": holdout_model})
+        return store, model, holdout_model
+
+
+def start_global_forecaster(df):
+    # Returns True once the models for this dataset version are ready
+    fingerprint = dataset_fingerprint(df)
+    with _build_lock:
+        if _forecaster_cache["fingerprint"] == fingerprint:
+            return True
+        thread = _build["thread"]
+        if _build["fingerprint"] != fingerprint or thread is None or not thread.is_alive():
+            thread = threading.Thread(target=get_global_forecaster, args=(df, fingerprint), name="global-forecaster", daemon=True)
+            _build.update({"fingerprint": fingerprint, "thread": thread})
+            thread.start()
+    return False
+
+
+def forecast_global_selection(df, countries, products):
+    from utils.backtesting import backtest_summary
+
+    store, model, holdout_model = get_global_forecaster(df)
+    labels = pd.DataFrame(store.labels, columns=list(store.keys))
+    series = np.flatnonzero(labels["Country"].isin([str(c) for c in countries])
+                            & labels["Product Group"].isin([str(p) for p in products]))
+    observed = np.flatnonzero(store.values[series].sum(axis=0)) if len(series) else []
+    if not len(observed):
+        return None, {"error": "No data for selected Country(ies) & Product Group(s)"}
+
+    # Forecast from the selection's own last observed week, not the latest week of any series
+    origin = int(observed[-1])
+    rows, predictions = model._score(store, origin)
+    selected = np.isin(rows["_series"].to_numpy(), series)
+    forecast = pd.Series(predictions[selected]).groupby(rows["horizon"].to_numpy()[selected]).sum()
+    forecast.index = store.weeks[0] + pd.to_timedelta(7 * (origin + forecast.index.to_numpy()), unit="D")
+    forecast.index = pd.DatetimeIndex(forecast.index, freq="W")
+
+    # Out-of-sample accuracy on the selection's weeks inside the holdout window
+    backtest = None
+    if holdout_model is not None:
+        holdout = _holdout_forecasts(store, holdout_model, len(store.weeks) - 1 - HOLDOUT_WEEKS, origin, series)
+        if len(holdout):
+            backtest = backtest_summary(holdout, model.horizon)
+
+    metrics = {
+        "RMSE": None, "MAE": None, "MAPE": None, "R2": None, "reliability_score": None,
+        **(backtest["overall"] if backtest else {}),
+        "backtest": backtest,
+        "model_params": {
+            "method": "global",
+            "description": f"Global gradient boosting over {model.info['series']} series "
+                           f"({model.info['training_rows']:,} training rows, fit in {model.info['fit_seconds']}s)",
+        },
+    }
+    return forecast, metrics
+
+
+def evaluate_global_model(df, holdout_weeks=HOLDOUT_WEEKS):
+    # Train with the last holdout_weeks hidden, then score each hidden week's 1..H forecasts
+    from utils.backtesting import backtest_summary
+
+    store = LagFeatureStore.from_dataframe(df)
+    last_origin = len(store.weeks) - 1 - holdout_weeks
+    model = GlobalDemandModel().fit(store, last_origin=last_origin)
+    return backtest_summary(_holdout_forecasts(store, model, last_origin, len(store.weeks) - 1), model.horizon)
@@ -1,54 +1,389 @@
+import os
+import json
+import time
+import threading
+import datetime
 import gspread
 import pandas as pd
+from gspread.utils import numericise_all, rowcol_to_a1, a1_range_to_grid_range, ValueRenderOption
 from oauth2client.service_account import ServiceAccountCredentials
+from utils.memory_utils import compact_dataframe
+from utils.date_parsing import DATE_COLUMNS, parse_date_columns
+from utils.freight_utils import resolve_freight_and_weight
+from utils.derived_data import dataset_fingerprint
+
+SNAPSHOT_PATH = os.path.join(".cache", "sheets_snapshot.pkl")
+SNAPSHOT_META_PATH = os.path.join(".cache", "sheets_snapshot.json")
+DEFAULT_TTL_SECONDS = 300
+SHEET_KEY = "1bFSmd406F180Xr0kjQqkNj0oEVhKkXTkgfmOO19EsXw"
+
+SCOPE = ["https://spreadsheets.google.com/feeds",
+         "https://www.googleapis.com/auth/drive"]
+TOKEN_LIFETIME_SECONDS = 3600
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 1.0
+
+
+_snapshot_lock = threading.Lock()
+_snapshot = {"df": None, "meta": None}
+
+_pool_lock = threading.RLock()
+_pool = {"client": None, "creds": None, "authorized_at": 0.0, "worksheets": {}}
+
+_stats_lock = threading.Lock()
+_api_stats = {}
 
 # ---------------------------------------------
-# 🔄 Load existing records
+# 🔐 Shared authorized client and worksheet pool
 # ---------------------------------------------
-def load_data_from_sheets():
-    scope = ["https://spreadsheets.google.com/feeds",
-             "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        "service_account.json", scope)
-    client = gspread.authorize(creds)
+# One client per process, shared by every Streamlit session and thread.
+# It is re-authorized shortly before the access token expires instead of
+# on every call, and opened worksheets are reused by spreadsheet key.
+def _token_expires_soon():
+    expiry = getattr(_pool["creds"], "token_expiry", None)
+    if expiry is not None:
+        remaining = (expiry - datetime.datetime.utcnow()).total_seconds()
+    else:
+        remaining = TOKEN_LIFETIME_SECONDS - (time.time() - _pool["authorized_at"])
+    return remaining < TOKEN_REFRESH_MARGIN_SECONDS
+
+
+def get_client():
+    with _pool_lock:
+        if _pool["client"] is None or _token_expires_soon():
+            creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", SCOPE)
+            _pool["client"] = _timed_call("authorize", gspread.authorize, creds)
+            _pool["creds"] = creds
+            _pool["authorized_at"] = time.time()
+            _pool["worksheets"] = {}
+        return _pool["client"]
+
 
-    sheet = client.open("Supply_Chain_Data").sheet1
-    data = sheet.get_all_records()
+def get_worksheet(key=SHEET_KEY):
+    client = get_client()
+    with _pool_lock:
+        if key not in _pool["worksheets"]:
+            _pool["worksheets"][key] = _timed_call("open_by_key", client.open_by_key, key).sheet1
+        return _pool["worksheets"][key]
 
-    df = pd.DataFrame(data)
+
+def reset_client_pool():
+    with _pool_lock:
+        _pool.update({"client": None, "creds": None, "authorized_at": 0.0, "worksheets": {}})
+
+
+def _timed_call(operation, func, *args, **kwargs):
+    start = time.perf_counter()
+    error = None
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        error = e
+        # A rejected token means the pooled client is stale; rebuild it next time
+        if isinstance(e, gspread.exceptions.APIError) and e.response is not None and e.response.status_code == 401:
+            reset_client_pool()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            stats = _api_stats.setdefault(operation, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += error is not None
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+
+def get_api_stats():
+    with _stats_lock:
+        return {
+            operation: {**stats, "avg_seconds": stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0}
+            for operation, stats in _api_stats.items()
+        }
+
+
+def _coerce_types(df, resolve_references=True):
     df.columns = df.columns.str.strip()
 
-    date_columns = [
-        "PQ First Sent to Client Date",
-        "PO Sent to Vendor Date",
-        "Scheduled Delivery Date",
-        "Delivered to Client Date",
-        "Delivery Recorded Date"
-    ]
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
+    df = parse_date_columns(df)
+
+    # "See ASN-.. (ID#:..)" weights and freight costs point at other rows,
+    # so they are resolved before the columns become numeric
+    if resolve_references:
+        df, _ = resolve_freight_and_weight(df)
+
+    return df
 
-    num_columns = ["Weight (Kilograms)", "Freight Cost (USD)"]
-    for col in num_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+# ---------------------------------------------
+# 🔄 Load existing records
+# ---------------------------------------------
+def load_data_from_sheets(cached=False, ttl_seconds=DEFAULT_TTL_SECONDS, force_refresh=False, compact=False):
+    if cached:
+        return _load_from_snapshot(ttl_seconds, force_refresh, compact)
 
-    return df, date_columns
+    sheet = get_worksheet()
+    data = _timed_call("get_all_records", sheet.get_all_records)
+
+    df = _coerce_types(pd.DataFrame(data))
+    if compact:
+        df = compact_dataframe(df)
+    return df, DATE_COLUMNS
+
+# ---------------------------------------------
+# 💾 Local snapshot with a row high-water mark
+# ---------------------------------------------
+# The snapshot holds the already-typed frame plus the number of sheet rows
+# ingested so far. Once the TTL expires only rows appended after that mark
+# are fetched; the sheet is treated as append-only, so edits or deletions
+# of existing rows are only picked up by a forced refresh.
+def refresh_sheets_snapshot():
+    return load_data_from_sheets(cached=True, force_refresh=True)
+
+
+def _read_snapshot():
+    if _snapshot["df"] is not None:
+        return _snapshot["df"], _snapshot["meta"]
+
+    if not (os.path.exists(SNAPSHOT_PATH) and os.path.exists(SNAPSHOT_META_PATH)):
+        return None, None
+
+    try:
+        df = pd.read_pickle(SNAPSHOT_PATH)
+        with open(SNAPSHOT_META_PATH) as f:
+            meta = json.load(f)
+    except Exception as e:
+        print("Error reading sheets snapshot:", e)
+        return None, None
+
+    _snapshot["df"], _snapshot["meta"] = df, meta
+    return df, meta
+
+
+def _write_snapshot(df, meta):
+    os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+
+    # Fingerprint once per snapshot version so serving it can key on it cheaply
+    meta["fingerprint"] = dataset_fingerprint(df)
+
+    # Write to temp files first so concurrent sessions never see a torn snapshot
+    df.to_pickle(SNAPSHOT_PATH + ".tmp")
+    with open(SNAPSHOT_META_PATH + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(SNAPSHOT_PATH + ".tmp", SNAPSHOT_PATH)
+    os.replace(SNAPSHOT_META_PATH + ".tmp", SNAPSHOT_META_PATH)
+
+    _snapshot["df"], _snapshot["meta"] = df, meta
+
+
+def _fetch_full(sheet):
+    values = _timed_call("get_all_values", sheet.get_all_values)
+    if not values:
+        return pd.DataFrame(), [], 0
+
+    header, rows = values[0], values[1:]
+    # Blank rows are left out of the frame but still count towards the row mark
+    filled = [row for row in rows if any(cell != "" for cell in row)]
+    return _rows_to_frame(header, filled), header, len(rows)
+
+
+def _fetch_appended(sheet, header, rows_ingested):
+    # Row 1 is the header, so ingested data ends at sheet row rows_ingested + 1.
+    # The range is open-ended: the pooled worksheet's row_count is only updated
+    # by this process's own appends, so rows other writers added past it
+    # would be skipped
+    start_row = rows_ingested + 2
+    last_column = rowcol_to_a1(1, max(len(header), 1)).rstrip("0123456789")
+    try:
+        rows = _timed_call("get_values", sheet.get_values, f"A{start_row}:{last_column}")
+    except gspread.exceptions.APIError as e:
+        # A start past the sheet's actual grid means nothing was appended
+        if "exceeds grid limits" in str(e):
+            return None, 0
+        raise
+    filled = [i for i, row in enumerate(rows) if any(cell != "" for cell in row)]
+    if not filled:
+        return None, 0
+
+    # The mark advances over the sheet span up to the last filled row, blank rows
+    # inside it included, so the next refresh starts after it; trailing blanks
+    # are not counted because they may be filled in later
+    span = filled[-1] + 1
+    rows = [rows[i] for i in filled]
+
+    # References may point at rows already in the snapshot, so resolve after the concat
+    return _rows_to_frame(header, rows, resolve_references=False), span
+
+
+def _rows_to_frame(header, rows, resolve_references=True):
+    width = len(header)
+    records = [numericise_all((row + [""] * width)[:width]) for row in rows]
+    return _coerce_types(pd.DataFrame(records, columns=header), resolve_references)
+
+
+def _serve_snapshot(df, meta, compact):
+    if not compact:
+        return df.copy()
+
+    # Compact once per snapshot version rather than on every rerun; a TTL
+    # refresh that appended nothing keeps the same fingerprint
+    if _snapshot.get("compact_for") != meta.get("fingerprint"):
+        _snapshot["compact_df"] = compact_dataframe(df)
+        _snapshot["compact_for"] = meta.get("fingerprint")
+    return _snapshot["compact_df"].copy()
+
+
+def _load_from_snapshot(ttl_seconds, force_refresh, compact):
+    with _snapshot_lock:
+        df, meta = _read_snapshot()
+
+        is_fresh = meta is not None and time.time() - meta["fetched_at"] < ttl_seconds
+        if df is not None and is_fresh and not force_refresh:
+            return _serve_snapshot(df, meta, compact), DATE_COLUMNS
+
+        sheet = get_worksheet()
+
+        if df is None or force_refresh or _timed_call("row_values", sheet.row_values, 1) != meta["header"]:
+            df, header, rows_ingested = _fetch_full(sheet)
+        else:
+            header, rows_ingested = meta["header"], meta["rows_ingested"]
+            new_rows, span = _fetch_appended(sheet, header, rows_ingested)
+            if span:
+                df, _ = resolve_freight_and_weight(pd.concat([df, new_rows], ignore_index=True))
+                rows_ingested += span
+
+        meta = {"header": header, "rows_ingested": rows_ingested, "fetched_at": time.time()}
+        _write_snapshot(df, meta)
+
+        return _serve_snapshot(df, meta, compact), DATE_COLUMNS
 
 # ---------------------------------------------
 # ➕ Append new row to Google Sheet
 # ---------------------------------------------
 def append_row_to_sheet(row):
     try:
-        scope = ["https://spreadsheets.google.com/feeds",
-                 "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", scope)
-        client = gspread.authorize(creds)
-
-        sheet = client.open_by_key("1bFSmd406F180Xr0kjQqkNj0oEVhKkXTkgfmOO19EsXw").sheet1
-        sheet.append_row(row)
+        sheet = get_worksheet()
+        _timed_call("append_row", sheet.append_row, row)
         return True
     except Exception as e:
         print("Error appending to sheet:", e)
         return False
+
+# ---------------------------------------------
+# 📦 Bulk append in batches
+# ---------------------------------------------
+# Rows are sent in order, one append_rows request per batch. A batch that
+# still fails after its retries stops the upload; the result's "next_row"
+# is the index to pass back as start_row to resume from that batch, and
+# the failure's "after_row" as after_row.
+#
+# A failed request may still have been written (e.g. a timeout after the
+# append went through). Before a batch is sent again, the sheet rows after
+# a mark taken before its first attempt are searched for the batch's own
+# content; an append writes all of its rows as one block, so finding that
+# block means it landed. Content is matched rather than counted, so rows
+# other writers append in the meantime cannot make a batch look landed or
+# missing.
+def append_rows_to_sheet(rows, batch_size=DEFAULT_BATCH_SIZE, start_row=0,
+                         max_retries=DEFAULT_MAX_RETRIES, backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+                         progress_callback=None, after_row=None):
+    result = {"total": len(rows), "appended": 0, "next_row": start_row, "failures": []}
+    if start_row >= len(rows):
+        return result
+
+    try:
+        get_worksheet()
+    except Exception as e:
+        print("Error opening sheet for bulk append:", e)
+        result["failures"].append({"batch": start_row // batch_size, "rows": (start_row, len(rows)),
+                                   "error": str(e), "after_row": after_row})
+        return result
+
+    # after_row is the mark of an earlier, failed attempt at the first batch
+    mark, resuming = after_row, after_row is not None
+    for batch_start in range(start_row, len(rows), batch_size):
+        batch = rows[batch_start:batch_start + batch_size]
+        batch_end = batch_start + len(batch)
+
+        error = None
+        for attempt in range(max_retries + 1):
+            try:
+                # Re-fetch per attempt so a retry picks up a re-authorized client
+                sheet = get_worksheet()
+                if mark is None:
+                    mark = _sheet_row_mark(sheet)
+                elif (attempt or resuming) and _batch_landed(sheet, batch, mark):
+                    error = None
+                    break
+                response = _timed_call("append_rows", sheet.append_rows, batch)
+                # The next batch lands after this one, so its mark is exact
+                mark = _updated_end_row(response) or mark
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt < max_retries:
+                    time.sleep(backoff_seconds * 2 ** attempt)
+        resuming = False
+
+        if error is not None:
+            print("Error appending batch to sheet:", error)
+            result["failures"].append({"batch": batch_start // batch_size, "rows": (batch_start, batch_end),
+                                       "error": str(error), "after_row": mark})
+            return result
+
+        result["appended"] += len(batch)
+        result["next_row"] = batch_end
+        if progress_callback:
+            progress_callback(batch_end, len(rows))
+
+    return result
+
+
+def _sheet_row_mark(sheet):
+    # A sheet row at or before the last written one. Column A can be blank on
+    # the last rows, so this may undercount; that only widens the search in
+    # _batch_landed, it never skips a row
+    return len(_timed_call("col_values", sheet.col_values, 1))
+
+
+def _updated_end_row(response):
+    updated = (response or {}).get("updates", {}).get("updatedRange")
+    if not updated:
+        return None
+    return a1_range_to_grid_range(updated.split("!")[-1])["endRowIndex"]
+
+
+def _cell_key(value):
+    # Sheets returns unformatted numbers as numbers and RAW strings as sent
+    if value is None or value == "":
+        return ""
+    try:
+        return repr(round(float(value), 6))
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def _batch_landed(sheet, batch, after_row):
+    width = max(len(row) for row in batch)
+    last_column = rowcol_to_a1(1, width).rstrip("0123456789")
+    try:
+        values = _timed_call("get_values", sheet.get_values, f"A{after_row + 1}:{last_column}",
+                             value_render_option=ValueRenderOption.unformatted)
+    except gspread.exceptions.APIError as e:
+        if "exceeds grid limits" in str(e):
+            return False
+        raise
+
+    def keys(row):
+        return tuple(_cell_key(cell) for cell in (list(row) + [""] * width)[:width])
+
+    expected = [keys(row) for row in batch]
+    found = [keys(row) for row in values]
+    return any(found[i:i + len(expected)] == expected for i in range(len(found) - len(expected) + 1))
+
+
+def dataframe_to_rows(df):
+    # gspread needs plain Python values; NaN becomes an empty cell as before
+    return df.astype(object).where(df.notna(), "").values.tolist()
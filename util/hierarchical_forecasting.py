@@ -0,0 +1,130 @@
+import time
+import numpy as np
+import pandas as pd
+from utils.baseline_forecasting import series_matrix, forecast_matrix
+
+HIERARCHY = ("Country", "Product Group", "Vendor")
+ALL_LABEL = "All"
+RECONCILIATION_METHODS = {
+    "bottom_up": "Bottom-up",
+    "mint_shrink": "MinT (shrinkage covariance)",
+    "wls_struct": "WLS (structural scaling)",
+}
+
+# ---------------------------------------------
+# 🌳 Aggregation matrix
+# ---------------------------------------------
+# Levels: grand total, each Country, each Product Group, each Country x
+# Product Group, and the Country x Product Group x Vendor bottom series.
+# Country and Product Group cross rather than nest, so both margins are rows.
+def hierarchy_levels(keys=HIERARCHY):
+    keys = tuple(keys)
+    return list(dict.fromkeys([()] + [(key,) for key in keys[:2]] + [keys[:2], keys]))
+
+
+def build_summing_matrix(bottom, keys=HIERARCHY):
+    nodes, blocks = [], []
+    for level in hierarchy_levels(keys):
+        if level:
+            codes, groups = pd.MultiIndex.from_frame(bottom[list(level)]).factorize()
+        else:
+            codes, groups = np.zeros(len(bottom), dtype=int), [()]
+
+        block = np.zeros((len(groups), len(bottom)))
+        block[codes, np.arange(len(bottom))] = 1.0
+        blocks.append(block)
+
+        for group in groups:
+            values = dict(zip(level, group if isinstance(group, tuple) else (group,)))
+            nodes.append({"Level": " x ".join(level) or "Total", **{k: values.get(k, ALL_LABEL) for k in keys}})
+
+    return pd.DataFrame(nodes), np.vstack(blocks)
+
+# ---------------------------------------------
+# 🧮 Reconciliation
+# ---------------------------------------------
+def _shrunk_covariance(residuals):
+    # Schafer-Strimmer shrinkage of the residual covariance towards its
+    # diagonal; with more series than weeks the sample covariance alone is singular
+    E = np.nan_to_num(residuals)
+    T = E.shape[1]
+    E = E - E.mean(axis=1, keepdims=True)
+    covariance = E @ E.T / T
+    std = np.sqrt(np.diag(covariance))
+    std = np.where(std > 0, std, 1.0)
+
+    X = E / std[:, np.newaxis]
+    correlation = X @ X.T / T
+    correlation_variance = ((X ** 2) @ (X ** 2).T / T - correlation ** 2) * T / max(T - 1, 1) ** 2
+    off_diagonal = ~np.eye(len(E), dtype=bool)
+    denominator = (correlation[off_diagonal] ** 2).sum()
+    shrinkage = float(np.clip(correlation_variance[off_diagonal].sum() / denominator, 0, 1)) if denominator else 1.0
+
+    shrunk = (1 - shrinkage) * covariance
+    shrunk[np.diag_indices_from(shrunk)] = np.diag(covariance)
+    return shrunk, shrinkage
+
+
+def reconciliation_matrix(S, method="mint_shrink", residuals=None):
+    # G maps base forecasts of every node to coherent bottom-level forecasts
+    n_nodes, n_bottom = S.shape
+    info = {}
+    if method == "bottom_up":
+        G = np.zeros((n_bottom, n_nodes))
+        G[:, n_nodes - n_bottom:] = np.eye(n_bottom)
+        return G, info
+
+    if method == "wls_struct":
+        W = np.diag(S.sum(axis=1))
+    elif method == "mint_shrink":
+        if residuals is None:
+            raise ValueError("MinT reconciliation needs base-model residuals.")
+        W, info["shrinkage"] = _shrunk_covariance(residuals)
+        # Series with no residual variance (e.g. all-zero history) would make W singular
+        W[np.diag_indices_from(W)] += 1e-9 * max(np.trace(W) / n_nodes, 1.0)
+    else:
+        raise ValueError(f"Unknown reconciliation method '{method}'")
+
+    W_inv_S = np.linalg.solve(W, S)
+    G = np.linalg.solve(S.T @ W_inv_S, W_inv_S.T)
+    return G, info
+
+
+def hierarchical_forecast(df, horizon=6, method="auto", reconciliation="mint_shrink", keys=HIERARCHY,
+                          value_col="Line Item Quantity"):
+    start = time.perf_counter()
+    bottom, weeks, values = series_matrix(df, keys, value_col)
+    if not len(bottom):
+        raise ValueError("No dated quantities to forecast.")
+
+    nodes, S = build_summing_matrix(bottom, keys)
+
+    # Aggregate histories: a node starts with its earliest member
+    started = (S @ (~np.isnan(values)).astype(float)) > 0
+    history = np.where(started, S @ np.nan_to_num(values), np.nan)
+
+    # One vectorized pass produces base forecasts for every node at every level
+    base, fitted = forecast_matrix(history, horizon, method, return_fitted=True)
+    G, info = reconciliation_matrix(S, reconciliation, residuals=history - fitted)
+
+    # Demand cannot be negative: clip at the bottom and re-aggregate so totals stay coherent
+    bottom_forecast = np.maximum(G @ base, 0)
+    reconciled = S @ bottom_forecast
+
+    future = pd.date_range(weeks[-1] + pd.Timedelta(weeks=1), periods=horizon, freq="W")
+    result = nodes.loc[nodes.index.repeat(horizon)].reset_index(drop=True)
+    result["Week"] = np.tile(future, len(nodes))
+    result["Base Forecast"] = np.maximum(base, 0).ravel()
+    result["Forecast"] = reconciled.ravel()
+
+    base_bottom_sum = S @ np.maximum(base[len(nodes) - len(bottom):], 0)
+    info.update({
+        "nodes": len(nodes),
+        "bottom_series": len(bottom),
+        "method": method,
+        "reconciliation": reconciliation,
+        # How far the unreconciled base forecasts were from adding up
+        "base_incoherence": float(np.abs(np.maximum(base, 0) - base_bottom_sum).max()),
+        "seconds": round(time.perf_counter() - start, 3),
+    })
+    return result, info
@@ -0,0 +1,64 @@
+import sys
+import numpy as np
+import pandas as pd
+
+CATEGORY_RATIO = 0.5
+FLOAT32_EXACT_LIMIT = 2 ** 24
+
+# ---------------------------------------------
+# 🗜️ Compact in-memory representation
+# ---------------------------------------------
+def _intern_strings(series):
+    return series.map(lambda x: sys.intern(x) if isinstance(x, str) else x)
+
+
+def _downcast_float(series):
+    values = series.dropna()
+    # float32 holds integers exactly only up to 2**24, so anything else stays float64
+    if len(values) and (values % 1 == 0).all() and values.abs().max() < FLOAT32_EXACT_LIMIT:
+        return series.astype(np.float32)
+    return series
+
+
+def compact_dataframe(df, category_ratio=CATEGORY_RATIO):
+    df = df.copy()
+
+    for col in df.columns:
+        series = df[col]
+
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            continue
+
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            df[col] = _downcast_float(series)
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            if "Unknown" not in series.cat.categories:
+                df[col] = series.cat.add_categories("Unknown")
+        elif series.dtype == object or pd.api.types.is_string_dtype(series):
+            if series.nunique(dropna=True) <= category_ratio * len(series):
+                # Tabs fill missing values with "Unknown", which must already be a category
+                categorical = series.astype("category")
+                if "Unknown" not in categorical.cat.categories:
+                    categorical = categorical.cat.add_categories("Unknown")
+                df[col] = categorical
+            elif series.dtype == object:
+                df[col] = _intern_strings(series)
+
+    return df
+
+# ---------------------------------------------
+# 📏 Per-column memory breakdown
+# ---------------------------------------------
+def memory_report(df):
+    usage = df.memory_usage(deep=True, index=False)
+    total = usage.sum()
+
+    report = pd.DataFrame({
+        "Column": usage.index,
+        "Dtype": [str(df[col].dtype) for col in usage.index],
+        "Memory (MB)": (usage.values / 1024 ** 2).round(3),
+        "Share (%)": (usage.values / total * 100).round(1) if total else 0.0,
+    })
+    return report.sort_values("Memory (MB)", ascending=False).reset_index(drop=True)
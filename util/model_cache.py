@@ -0,0 +1,147 @@
+import os
+import glob
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+MODEL_CACHE_DIR = os.path.join(".cache", "models")
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+MAX_CACHE_ENTRIES = 5000
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "warm_starts": 0, "cold_fits": 0, "evictions": 0}
+
+# ---------------------------------------------
+# 🔑 Content-addressed keys
+# ---------------------------------------------
+# Entries are named "<spec>-<length>-<series>.npz": spec hashes the model
+# settings, series hashes the observations and their dates. The length lets a
+# refit find cached fits of its own prefix without reading any file.
+def _spec_hash(order, seasonal_order, model_kwargs, fit_kwargs):
+    spec = repr((tuple(order), tuple(seasonal_order), sorted(model_kwargs.items()), sorted(fit_kwargs.items())))
+    return hashlib.sha1(spec.encode("utf-8")).hexdigest()[:16]
+
+
+def _series_hash(endog, exog=None):
+    digest = hashlib.sha1(pd.util.hash_pandas_object(endog, index=True).values.tobytes())
+    # Regressors are part of the data, not the spec: a grown series brings new exog rows
+    if exog is not None:
+        digest.update(pd.util.hash_pandas_object(pd.DataFrame(exog), index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def _entry_path(cache_dir, spec, length, series_hash):
+    return os.path.join(cache_dir, f"{spec}-{length:07d}-{series_hash}.npz")
+
+
+def _record(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def get_model_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+# ---------------------------------------------
+# 💾 Disk storage with LRU eviction
+# ---------------------------------------------
+def _read_params(path):
+    try:
+        with np.load(path) as data:
+            params = data["params"]
+        # mtime doubles as the last-used time for LRU eviction
+        os.utime(path)
+        return params
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_params(path, params, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, params=np.asarray(params))
+    os.replace(tmp_path, path)
+    _evict(cache_dir)
+
+
+def _evict(cache_dir, max_bytes=MAX_CACHE_BYTES, max_entries=MAX_CACHE_ENTRIES):
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, "*.npz")):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    while entries and (total > max_bytes or len(entries) > max_entries):
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+            _record("evictions")
+        except OSError:
+            pass
+        total -= size
+
+
+def _warm_start_params(endog, exog, spec, cache_dir):
+    # Longest cached fit whose series is an exact prefix of this one
+    lengths = {}
+    for path in glob.glob(os.path.join(cache_dir, f"{spec}-*.npz")):
+        _, length, series_hash = os.path.basename(path)[:-4].split("-")
+        length = int(length)
+        if length < len(endog):
+            lengths.setdefault(length, set()).add(series_hash)
+
+    for length in sorted(lengths, reverse=True):
+        prefix_exog = None if exog is None else pd.DataFrame(exog).iloc[:length]
+        prefix_hash = _series_hash(endog.iloc[:length], prefix_exog)
+        if prefix_hash in lengths[length]:
+            return _read_params(_entry_path(cache_dir, spec, length, prefix_hash))
+    return None
+
+# ---------------------------------------------
+# 🧠 Cached SARIMAX fit
+# ---------------------------------------------
+def fit_sarimax(endog, order, seasonal_order, cache_dir=MODEL_CACHE_DIR, fit_kwargs=None, exog=None, **model_kwargs):
+    fit_kwargs = dict(fit_kwargs or {})
+    fit_kwargs.setdefault("disp", False)
+
+    spec = _spec_hash(order, seasonal_order, model_kwargs, fit_kwargs)
+    series_hash = _series_hash(endog, exog)
+    path = _entry_path(cache_dir, spec, len(endog), series_hash)
+    model = SARIMAX(endog, exog=exog, order=order, seasonal_order=seasonal_order, **model_kwargs)
+
+    # Same series and spec: one Kalman filter pass with the stored parameters
+    params = _read_params(path) if os.path.exists(path) else None
+    if params is not None and len(params) == len(model.param_names):
+        _record("hits")
+        return model.smooth(params)
+
+    # Series only gained observations: start the optimizer from the previous optimum
+    start_params = _warm_start_params(endog, exog, spec, cache_dir) if os.path.isdir(cache_dir) else None
+    if start_params is not None and len(start_params) == len(model.param_names):
+        _record("warm_starts")
+        results = model.fit(start_params=start_params, **fit_kwargs)
+    else:
+        _record("cold_fits")
+        results = model.fit(**fit_kwargs)
+
+    try:
+        _write_params(path, results.params, cache_dir)
+    except OSError as e:
+        print(f"⚠️ Could not cache fitted model: {e}")
+    return results
+
+
+def clear_model_cache(cache_dir=MODEL_CACHE_DIR):
+    for path in glob.glob(os.path.join(cache_dir, "*.npz")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,149 @@
+import os
+import time
+import queue
+import warnings
+import multiprocessing
+from statsmodels.tsa.stattools import adfuller
+from utils.model_cache import fit_sarimax
+
+DEFAULT_TIME_BUDGET_SECONDS = 15.0
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+SEARCH_FIT_KWARGS = {"maxiter": 50}
+
+
+def describe_order(order, seasonal_order):
+    return f"SARIMA{tuple(order)}{tuple(seasonal_order)}"
+
+
+def differencing_order(series, is_stationary=None):
+    # d comes from the ADF test: a unit root needs one difference, a stationary series none
+    if is_stationary is None:
+        try:
+            is_stationary = adfuller(series)[1] < 0.05
+        except Exception:
+            is_stationary = False
+    return 0 if is_stationary else 1
+
+
+def seasonal_differencing_order(series, seasonal_period, d):
+    # D = 1 only when a seasonal difference of the d-differenced series lowers
+    # its variance; on noise it roughly doubles it, so D stays 0
+    values = series.diff().dropna() if d else series
+    seasonal_diff = values.diff(seasonal_period).dropna()
+    if len(seasonal_diff) < 2 or values.var() == 0:
+        return 0
+    return 1 if seasonal_diff.var() < values.var() else 0
+
+# ---------------------------------------------
+# 🧮 Candidate fit (runs in a worker process)
+# ---------------------------------------------
+def _fit_candidate(series, order, seasonal_order, model_kwargs):
+    warnings.filterwarnings("ignore")
+    try:
+        results = fit_sarimax(series, order, seasonal_order, fit_kwargs=SEARCH_FIT_KWARGS, **model_kwargs)
+        return order, seasonal_order, float(results.aic), None
+    except Exception as e:
+        return order, seasonal_order, None, str(e)
+
+# ---------------------------------------------
+# 🪜 Stepwise AIC search
+# ---------------------------------------------
+def _initial_candidates(d, D, m, seasonal):
+    P = Q = 1 if seasonal else 0
+    candidates = [((2, d, 2), (P, D, Q, m)), ((0, d, 0), (0, D, 0, m)),
+                  ((1, d, 0), (P, D, 0, m)), ((0, d, 1), (0, D, Q, m))]
+    return list(dict.fromkeys(candidates))
+
+
+def _neighbours(order, seasonal_order, max_p, max_q, max_P, max_Q):
+    (p, d, q), (P, D, Q, m) = order, seasonal_order
+    steps = [(dp, dq, 0, 0) for dp, dq in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1))]
+    steps += [(0, 0, dP, dQ) for dP, dQ in ((1, 0), (-1, 0), (0, 1), (0, -1))]
+
+    for dp, dq, dP, dQ in steps:
+        np_, nq, nP, nQ = p + dp, q + dq, P + dP, Q + dQ
+        if 0 <= np_ <= max_p and 0 <= nq <= max_q and 0 <= nP <= max_P and 0 <= nQ <= max_Q:
+            yield (np_, d, nq), (nP, D, nQ, m)
+
+
+def select_sarimax_order(series, seasonal_period, is_stationary=None, time_budget=DEFAULT_TIME_BUDGET_SECONDS,
+                         workers=DEFAULT_WORKERS, max_p=3, max_q=3, max_P=1, max_Q=1, **model_kwargs):
+    start = time.perf_counter()
+    d = differencing_order(series, is_stationary)
+
+    # Seasonal terms need at least two full cycles to be estimable; a period
+    # of 0 or 1 searches non-seasonal orders only (e.g. with Fourier regressors)
+    seasonal = seasonal_period > 1 and len(series) >= 2 * seasonal_period
+    seasonal_period = seasonal_period if seasonal else 0
+    D = seasonal_differencing_order(series, seasonal_period, d) if seasonal else 0
+    if not seasonal:
+        max_P = max_Q = 0
+
+    evaluated = {}
+    failures = 0
+    budget_exhausted = False
+    best = None
+
+    def record(result):
+        nonlocal best, failures
+        order, seasonal_order, aic, error = result
+        evaluated[(order, seasonal_order)] = aic
+        if aic is None:
+            failures += 1
+        elif best is None or aic < best[2]:
+            best = (order, seasonal_order, aic)
+
+    def remaining():
+        return time_budget - (time.perf_counter() - start)
+
+    # multiprocessing.Pool rather than an executor so fits still running when
+    # the budget expires can be terminated instead of burning CPU afterwards.
+    # Workers are spawned, not forked: Streamlit runs this from a process with
+    # live threads, and a forked child can inherit their held locks. Spawning
+    # costs a few seconds of the budget for the worker imports.
+    pool = multiprocessing.get_context("spawn").Pool(processes=workers) if workers and workers > 1 else None
+    finished = queue.Queue()
+    try:
+        candidates = _initial_candidates(d, D, seasonal_period, seasonal)
+        while candidates and not budget_exhausted:
+            previous_best = best
+            if pool is None:
+                for order, seasonal_order in candidates:
+                    if remaining() <= 0:
+                        budget_exhausted = True
+                        break
+                    record(_fit_candidate(series, order, seasonal_order, model_kwargs))
+            else:
+                for order, seasonal_order in candidates:
+                    pool.apply_async(_fit_candidate, (series, order, seasonal_order, model_kwargs), callback=finished.put)
+                for _ in candidates:
+                    try:
+                        record(finished.get(timeout=max(remaining(), 0)))
+                    except queue.Empty:
+                        budget_exhausted = True
+                        break
+
+            # Stepwise: keep moving while a neighbour of the best model improves AIC
+            if best is None or best == previous_best:
+                break
+            candidates = [c for c in _neighbours(best[0], best[1], max_p, max_q, max_P, max_Q) if c not in evaluated]
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if best is None:
+        raise ValueError("Automatic order selection found no model that could be fitted.")
+
+    order, seasonal_order, aic = best
+    return {
+        "order": order,
+        "seasonal_order": seasonal_order,
+        "aic": aic,
+        "d_from_adf": d,
+        "D_from_variance": D,
+        "candidates_evaluated": len(evaluated) - failures,
+        "candidates_failed": failures,
+        "seconds": round(time.perf_counter() - start, 2),
+        "budget_exhausted": budget_exhausted,
+        "description": f"Auto {describe_order(order, seasonal_order)} (AIC {aic:.1f})",
+    }
@@ -1,15 +1,26 @@
 import pandas as pd
 import numpy as np
 import re
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+from utils.model_cache import fit_sarimax
+from utils.backtesting import rolling_origin_backtest
+from utils.order_selection import select_sarimax_order, DEFAULT_TIME_BUDGET_SECONDS
+from utils.baseline_forecasting import forecast_baseline_series, backtest_baseline, PRICE_METHOD_LABELS
+from utils.date_parsing import ensure_datetime
 from utils.freight_utils import clean_freight_cost_column_with_id_priority
 
+YEAR_IN_WEEKS = 365.25 / 7
+FOURIER_ORIGIN = pd.Timestamp("2000-01-02")
+FOURIER_ARIMA_ORDER = (1, 1, 1)
+DEFAULT_HARMONICS = 3
+
 def preprocess_dataframe_for_forecast(df):
     df = df.copy()
 
-    # Clean Freight Cost specifically
-    df = clean_freight_cost_column_with_id_priority(df)
+    # Clean Freight Cost specifically; a frame from get_cleaned_dataset is
+    # already numeric and filled, so it skips the reference resolution
+    freight = df.get("Freight Cost (USD)")
+    if freight is not None and not (pd.api.types.is_numeric_dtype(freight) and freight.notna().all()):
+        df = clean_freight_cost_column_with_id_priority(df)
 
     # Numeric columns
     numeric_cols = ["Unit Price", "Weight (Kilograms)", "Line Item Quantity"]
@@ -39,43 +50,140 @@ def preprocess_dataframe_for_forecast(df):
 
     return df
 
-def prepare_timeseries_data(df, date_col="Delivered to Client Date"):
-    df = preprocess_dataframe_for_forecast(df)
+def prepare_timeseries_data(df, date_col="Delivered to Client Date", preprocessed=False):
+    df = df.copy() if preprocessed else preprocess_dataframe_for_forecast(df)
 
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+    df[date_col] = ensure_datetime(df[date_col])
     df = df.dropna(subset=[date_col, "Unit Price"])
     df = df.set_index(date_col)
 
     # Keep only numeric columns before resampling
     df_numeric = df.select_dtypes(include=[np.number])
 
-    ts_df = df_numeric.resample("W").mean()[["Unit Price"]].dropna()
+    # Weeks without deliveries have no price; fill them along the time axis so
+    # every model sees a regular weekly series instead of silently joined gaps
+    ts_df = df_numeric.resample("W").mean()[["Unit Price"]].interpolate(method="time")
     return ts_df
 
-def forecast_unit_price(ts_df, forecast_weeks):
-    if len(ts_df) < 10:
+def forecast_unit_price(ts_df, forecast_weeks, auto_order=False, time_budget=DEFAULT_TIME_BUDGET_SECONDS, method="sarimax",
+                        seasonality="seasonal_arima", harmonics=DEFAULT_HARMONICS):
+    if len(ts_df) < 2:
         raise ValueError("Not enough data to build a reliable forecast model.")
 
+    fallback = None
+    if method == "sarimax":
+        try:
+            if len(ts_df) < 10:
+                raise ValueError("Not enough data to build a reliable forecast model.")
+            if seasonality == "fourier":
+                return _fourier_unit_price(ts_df, forecast_weeks, harmonics, auto_order, time_budget)
+            return _sarimax_unit_price(ts_df, forecast_weeks, auto_order, time_budget)
+        except Exception as e:
+            # Sparse series often break the weekly SARIMAX; the baselines always produce a forecast
+            fallback = f"SARIMAX failed ({e}); fell back to the baseline model"
+            method = "smooth_auto"
+
     try:
-        model = SARIMAX(ts_df, order=(1,1,1), seasonal_order=(0,1,1,52))
-        results = model.fit(disp=False)
+        return _baseline_unit_price(ts_df, forecast_weeks, method, fallback)
+    except Exception as e:
+        raise ValueError(f"Forecasting failed: {str(e)}")
 
-        forecast = results.forecast(steps=forecast_weeks)
 
-        metrics = None
-        if len(ts_df) >= 20:
-            train = ts_df.iloc[:-4]
-            test = ts_df.iloc[-4:]
-            eval_model = SARIMAX(train, order=(1,1,1), seasonal_order=(0,1,1,52)).fit(disp=False)
-            pred = eval_model.forecast(steps=4)
+def _sarimax_unit_price(ts_df, forecast_weeks, auto_order, time_budget):
+    order, seasonal_order = (1,1,1), (0,1,1,52)
+    model_params = {"order": order, "seasonal_order": seasonal_order, "description": "Default SARIMA(1,1,1)(0,1,1,52)"}
 
-            mae = mean_absolute_error(test, pred)
-            rmse = np.sqrt(mean_squared_error(test, pred))
-            
+    # One fit on the first 80% (at least 4 weeks held out), then 1-4 week
+    # forecasts from every later origin without refitting
+    train_size = min(int(len(ts_df) * 0.8), len(ts_df) - 4) if len(ts_df) >= 20 else len(ts_df)
 
-            metrics = {"mae": mae, "rmse": rmse}
+    if auto_order:
+        selection = select_sarimax_order(ts_df["Unit Price"].iloc[:train_size], 52, time_budget=time_budget)
+        order, seasonal_order = selection["order"], selection["seasonal_order"]
+        model_params = {"order": order, "seasonal_order": seasonal_order,
+                        "description": selection["description"], "selection": selection}
 
-        return ts_df, forecast, metrics
+    results = fit_sarimax(ts_df, order, seasonal_order)
 
-    except Exception as e:
-        raise ValueError(f"Forecasting failed: {str(e)}")
+    forecast = results.forecast(steps=forecast_weeks)
+
+    metrics = None
+    if len(ts_df) >= 20:
+        eval_model = fit_sarimax(ts_df.iloc[:train_size], order, seasonal_order)
+        backtest = rolling_origin_backtest(eval_model, ts_df, train_size, horizons=4)
+
+        metrics = {"mae": backtest["overall"]["MAE"], "rmse": backtest["overall"]["RMSE"], "backtest": backtest}
+    elif auto_order:
+        metrics = {"mae": None, "rmse": None}
+
+    if metrics is not None:
+        metrics["model_params"] = model_params
+
+    return ts_df, forecast, metrics
+
+
+# --- Fourier seasonality: low-order ARIMA with yearly harmonics as regressors ---
+def fourier_terms(index, harmonics=DEFAULT_HARMONICS, period=YEAR_IN_WEEKS):
+    # Phase comes from the dates themselves, so weeks missing from the series do not shift the cycle
+    weeks = np.asarray((index - FOURIER_ORIGIN) / pd.Timedelta(weeks=1), dtype=float)
+    terms = {}
+    for k in range(1, harmonics + 1):
+        terms[f"sin_{k}"] = np.sin(2 * np.pi * k * weeks / period)
+        terms[f"cos_{k}"] = np.cos(2 * np.pi * k * weeks / period)
+    return pd.DataFrame(terms)
+
+
+def _fourier_unit_price(ts_df, forecast_weeks, harmonics, auto_order, time_budget):
+    order = FOURIER_ARIMA_ORDER
+
+    # Positional endog: the calendar lives in the regressors, which are computed
+    # from the dates, so the model itself needs no date index
+    prices = ts_df["Unit Price"].reset_index(drop=True)
+    exog = fourier_terms(ts_df.index, harmonics)
+    future_index = pd.date_range(ts_df.index[-1] + pd.Timedelta(weeks=1), periods=forecast_weeks, freq="W")
+
+    train_size = min(int(len(ts_df) * 0.8), len(ts_df) - 4) if len(ts_df) >= 20 else len(ts_df)
+
+    selection = None
+    if auto_order:
+        selection = select_sarimax_order(prices.iloc[:train_size], 0, time_budget=time_budget, exog=exog.iloc[:train_size])
+        order = selection["order"]
+
+    description = f"ARIMA{order} + {harmonics} yearly Fourier harmonics"
+    model_params = {"order": order, "seasonal_order": (0, 0, 0, 0), "harmonics": harmonics, "description": description}
+    if selection:
+        model_params["selection"] = selection
+
+    results = fit_sarimax(prices, order, (0, 0, 0, 0), exog=exog)
+    forecast = results.forecast(steps=forecast_weeks, exog=fourier_terms(future_index, harmonics))
+    forecast = pd.Series(np.asarray(forecast), index=future_index)
+
+    metrics = None
+    if len(ts_df) >= 20:
+        eval_model = fit_sarimax(prices.iloc[:train_size], order, (0, 0, 0, 0), exog=exog.iloc[:train_size])
+        backtest = rolling_origin_backtest(eval_model, prices, train_size, horizons=4, exog=exog)
+
+        metrics = {"mae": backtest["overall"]["MAE"], "rmse": backtest["overall"]["RMSE"], "backtest": backtest}
+    elif auto_order:
+        metrics = {"mae": None, "rmse": None}
+
+    if metrics is not None:
+        metrics["model_params"] = model_params
+
+    return ts_df, forecast, metrics
+
+
+def _baseline_unit_price(ts_df, forecast_weeks, method, fallback=None):
+    prices = ts_df["Unit Price"]
+    forecast = forecast_baseline_series(prices, forecast_weeks, method=method, lower_bound=0)
+
+    metrics = {"mae": None, "rmse": None}
+    if len(ts_df) >= 20:
+        train_size = min(int(len(ts_df) * 0.8), len(ts_df) - 4)
+        backtest = backtest_baseline(prices, train_size, horizons=4, method=method)
+        metrics = {"mae": backtest["overall"]["MAE"], "rmse": backtest["overall"]["RMSE"], "backtest": backtest}
+
+    metrics["model_params"] = {"method": method, "description": PRICE_METHOD_LABELS[method]}
+    if fallback:
+        metrics["fallback"] = fallback
+    return ts_df, forecast, metrics
@@ -0,0 +1,100 @@
+import os
+import re
+import json
+import pandas as pd
+from utils.query_engine import METRICS, DIMENSIONS, DELAY_COL, has_phrase
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("PHARMABOT_TOKEN_BUDGET", "3000"))
+CHARS_PER_TOKEN = 4
+BASE_COLUMNS = ["Country", "Product Group", "Vendor", "Delivered to Client Date", "Line Item Quantity"]
+EXTRA_KEYWORDS = {
+    "Scheduled Delivery Date": ("schedule", "late", "delay", "on time"),
+    "Dosage Form": ("dosage", "tablet", "capsule", "kit", "form"),
+    "Item Description": ("item", "drug", "molecule", "brand", "description"),
+    "Shipment Mode": ("mode", "air", "truck", "ocean", "charter"),
+    "Manufacturing Site": ("site", "manufacture", "manufacturer", "manufacturing", "factory", "factories"),
+}
+
+# ---------------------------------------------
+# 📏 Token estimate
+# ---------------------------------------------
+# Roughly four characters per token for English and CSV text; close enough to
+# budget a prompt without shipping a tokenizer.
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+# ---------------------------------------------
+# 🧹 Column selection and compact serialization
+# ---------------------------------------------
+def select_columns(question, columns):
+    text = question.lower()
+    wanted = list(BASE_COLUMNS)
+    # Whole words only, so "air" does not match "repair" nor "late" "related"
+    for phrase, column in METRICS + DIMENSIONS:
+        if has_phrase(text, phrase, inflected=True):
+            # Delay is derived from the scheduled and delivered dates
+            wanted.append("Scheduled Delivery Date" if column == DELAY_COL else column)
+    for column, keywords in EXTRA_KEYWORDS.items():
+        if any(has_phrase(text, keyword, inflected=True) for keyword in keywords):
+            wanted.append(column)
+    # Columns named verbatim in the question are always kept
+    wanted += [c for c in columns if re.search(rf"(?<!\w){re.escape(c.lower())}(?!\w)", text)]
+    return [c for c in dict.fromkeys(wanted) if c in columns]
+
+
+def to_compact_csv(frame):
+    # Dates lose their midnight time, floats keep two decimals, empty columns go
+    frame = frame.dropna(axis=1, how="all").copy()
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime("%Y-%m-%d")
+        elif pd.api.types.is_float_dtype(frame[column]):
+            frame[column] = frame[column].round(2)
+    return frame.to_csv(index=False).strip()
+
+
+def fit_rows_to_budget(frame, token_budget):
+    # Rows arrive most relevant first; keep the longest prefix that fits
+    low, high = 0, len(frame)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(to_compact_csv(frame.head(middle))) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    return frame.head(low), to_compact_csv(frame.head(low)) if low else ""
+
+# ---------------------------------------------
+# 📦 Context builder
+# ---------------------------------------------
+def build_record_context(records, question, token_budget=DEFAULT_TOKEN_BUDGET):
+    columns = select_columns(question, list(records.columns))
+    kept, text = fit_rows_to_budget(records[columns], token_budget)
+
+    # The indented JSON dump this replaces, for the size report
+    json_tokens = estimate_tokens(json.dumps(records.astype(str).to_dict(orient="records"), indent=2))
+    report = {
+        "records": len(records),
+        "records_sent": len(kept),
+        "columns": len(records.columns),
+        "columns_sent": len(columns),
+        "context_tokens": estimate_tokens(text),
+        "json_tokens": json_tokens,
+        "token_budget": token_budget,
+    }
+    return text, report
+
+
+def prompt_size_report(prompt, report=None):
+    report = dict(report or {})
+    report["prompt_characters"] = len(prompt)
+    report["prompt_tokens"] = estimate_tokens(prompt)
+    return report
+
+
+def describe_prompt_size(report):
+    text = f"Prompt: ~{report['prompt_tokens']:,} tokens"
+    if "records" in report:
+        text += (f" ({report['records_sent']}/{report['records']} records, {report['columns_sent']}/{report['columns']} columns;"
+                 f" the indented JSON of all retrieved records would be ~{report['json_tokens']:,} tokens)")
+    return text
@@ -0,0 +1,237 @@
+import re
+import numpy as np
+import pandas as pd
+from utils.date_parsing import ensure_datetime
+from utils.embedding_index import extract_filters, value_names
+
+DATE_COL = "Delivered to Client Date"
+FILTER_COLUMNS = ("Country", "Product Group", "Vendor", "Shipment Mode")
+IGNORED_VALUES = {"Unknown", "N/A", "nan"}
+DELAY_COL = "Delivery Delay (days)"
+MAX_RESULT_ROWS = 30
+
+# Phrases are tried in order, so longer phrases come before their substrings
+METRICS = [
+    ("freight", "Freight Cost (USD)"),
+    ("insurance", "Line Item Insurance (USD)"),
+    ("weight", "Weight (Kilograms)"),
+    ("kilograms", "Weight (Kilograms)"),
+    ("unit price", "Unit Price"),
+    ("pack price", "Pack Price"),
+    ("price", "Unit Price"),
+    ("line item value", "Line Item Value"),
+    ("value", "Line Item Value"),
+    ("spend", "Line Item Value"),
+    ("delay", DELAY_COL),
+    ("late", DELAY_COL),
+    ("quantity", "Line Item Quantity"),
+    ("units", "Line Item Quantity"),
+    ("demand", "Line Item Quantity"),
+    ("volume", "Line Item Quantity"),
+]
+MEAN_METRICS = {"Unit Price", "Pack Price", DELAY_COL}
+LATE_LABEL = "Late shipments"
+LATE_SHARE_LABEL = "Late share (%)"
+
+AGGREGATIONS = [
+    ("average", "mean"), ("avg", "mean"), ("mean", "mean"), ("median", "median"),
+    ("total", "sum"), ("sum", "sum"), ("maximum", "max"), ("max", "max"),
+    ("minimum", "min"), ("min", "min"),
+]
+# Bare nouns like "shipments" or "orders" appear in almost every question, so
+# only explicit counting, a measure, a grouping or a ranking makes it analytic
+COUNT_PHRASES = ("how many", "number of", "count")
+QUANTITY_CUES = ("how much", "how long", "how late", "how often", "compare", "what is the", "what was the",
+                 "what are the", "what were the")
+INFLECTIONS = r"(?:s|es|d|ed|ing)?"
+TOP_PHRASES = ("top", "most", "highest", "biggest", "largest")
+BOTTOM_PHRASES = ("least", "lowest", "smallest", "cheapest")
+
+DIMENSIONS = [
+    ("manufacturing site", "Manufacturing Site"),
+    ("site", "Manufacturing Site"),
+    ("shipment mode", "Shipment Mode"),
+    ("mode", "Shipment Mode"),
+    ("product group", "Product Group"),
+    ("product", "Product Group"),
+    ("dosage form", "Dosage Form"),
+    ("country", "Country"),
+    ("countries", "Country"),
+    ("vendor", "Vendor"),
+    ("year", "Year"),
+    ("month", "Month"),
+]
+
+# ---------------------------------------------
+# 🧭 Planner: question -> aggregation spec
+# ---------------------------------------------
+# A spec is a plain dict: filters (as extract_filters returns them),
+# group_by columns, metric column (None counts shipments), agg, order and
+# limit. Questions the planner cannot map return None.
+def has_phrase(question, phrase, inflected=False):
+    # Whole words only, so "air" is not found in "repair"; inflected also
+    # accepts "delays", "delayed" and the like
+    return re.search(rf"\b{re.escape(phrase)}{INFLECTIONS if inflected else ''}\b", question) is not None
+
+
+def _first(question, table, inflected=False):
+    return next((value for phrase, value in table if has_phrase(question, phrase, inflected)), None)
+
+
+def _group_by(question):
+    groups = []
+    for phrase, column in DIMENSIONS:
+        grouped = re.search(rf"\b(?:by|per|each|every|which|what|across|top|most)\s+(?:\w+\s+)?{re.escape(phrase)}s?\b", question)
+        if grouped and column not in groups:
+            groups.append(column)
+    return groups
+
+
+def filter_categories(df):
+    return {c: [v for v in df[c].dropna().astype(str).unique() if v not in IGNORED_VALUES]
+            for c in FILTER_COLUMNS if c in df.columns}
+
+
+def plan_query(question, df):
+    text = question.lower()
+    metric = _first(text, METRICS, inflected=True)
+    agg = _first(text, AGGREGATIONS)
+    group_by = _group_by(text)
+    order = "desc" if any(has_phrase(text, p) for p in TOP_PHRASES) else "asc" if any(has_phrase(text, p) for p in BOTTOM_PHRASES) else None
+    counting = any(has_phrase(text, p, inflected=p == "count") for p in COUNT_PHRASES)
+    ranked = bool(group_by and order)
+
+    # "Why were shipments delayed?" or "Which shipments were late?" name a
+    # measure but ask about records; those go to retrieval instead
+    if metric is None:
+        if not (counting or ranked):
+            return None
+        agg = "count"
+    elif not (agg or counting or group_by or any(has_phrase(text, p) for p in QUANTITY_CUES)):
+        return None
+    elif agg is None and counting and metric == DELAY_COL:
+        # "How many shipments were delayed?" counts the late ones
+        agg = "late"
+    elif agg is None:
+        agg = "mean" if metric in MEAN_METRICS else "sum"
+
+    # Several named values ("Vietnam and Nigeria", "2013 and 2014") are compared, not summed
+    filters = extract_filters(question, filter_categories(df))
+    for column, values in filters.items():
+        if column != "date_range" and len(set(value_names(values).values())) > 1 and column not in group_by:
+            group_by.append(column)
+    if len(set(re.findall(r"\b(20\d\d)\b", text))) > 1 and "Year" not in group_by:
+        group_by.append("Year")
+
+    limit = re.search(r"\btop\s+(\d+)\b", text)
+    return {
+        "filters": filters,
+        "group_by": group_by,
+        "metric": metric,
+        "agg": agg,
+        # Rankings sort by the measure; time groupings otherwise stay chronological
+        "order": order or ("desc" if group_by and not {"Year", "Month"} & set(group_by) else None),
+        "limit": min(int(limit.group(1)), MAX_RESULT_ROWS) if limit else MAX_RESULT_ROWS,
+    }
+
+
+def describe_spec(spec):
+    if spec["agg"] == "late":
+        parts = [f"{LATE_LABEL} ({DELAY_COL} > 0) and their share"]
+    else:
+        parts = ["Shipments" if spec["metric"] is None else f"{spec['agg'].capitalize()} of {spec['metric']}"]
+    if spec["group_by"]:
+        parts.append("by " + ", ".join(spec["group_by"]))
+    for key, value in spec["filters"].items():
+        parts.append(f"{value[0].date()} to {value[1].date()}" if key == "date_range" else f"{key} = {', '.join(value)}")
+    return "; ".join(parts)
+
+# ---------------------------------------------
+# ⚙️ Executor: spec -> result table
+# ---------------------------------------------
+def run_query(df, spec):
+    dates = ensure_datetime(df[DATE_COL]) if DATE_COL in df.columns else pd.Series(pd.NaT, index=df.index)
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in spec["filters"].items():
+        if column == "date_range":
+            mask &= ((dates >= values[0]) & (dates <= values[1])).to_numpy()
+        else:
+            mask &= df[column].astype(str).isin(values).to_numpy()
+
+    # Only the columns the spec touches are materialized for the matching rows
+    frame = pd.DataFrame(index=df.index[mask])
+    for column in spec["group_by"]:
+        if column == "Year":
+            frame[column] = dates[mask].dt.year
+        elif column == "Month":
+            frame[column] = dates[mask].dt.to_period("M").astype(str)
+        else:
+            frame[column] = df.loc[mask, column]
+    if spec["metric"] == DELAY_COL:
+        frame[DELAY_COL] = (dates[mask] - ensure_datetime(df.loc[mask, "Scheduled Delivery Date"])).dt.days
+    elif spec["metric"] is not None:
+        frame[spec["metric"]] = pd.to_numeric(df.loc[mask, spec["metric"]], errors="coerce")
+
+    metric = spec["metric"]
+    if spec["agg"] == "late":
+        # The share is of the shipments whose delay is known
+        delay = frame.pop(DELAY_COL)
+        frame[LATE_LABEL] = (delay > 0).where(delay.notna())
+        metric, label = LATE_LABEL, LATE_LABEL
+    else:
+        label = "Shipments" if metric is None else f"{spec['agg'].capitalize()} {metric}"
+
+    if spec["group_by"]:
+        grouped = frame.groupby(spec["group_by"], observed=True)
+        result = grouped.size().rename("Shipments").to_frame()
+        if spec["agg"] == "late":
+            result.insert(0, LATE_SHARE_LABEL, grouped[metric].mean() * 100)
+            result.insert(0, label, grouped[metric].sum().astype(int))
+        elif metric is not None:
+            result.insert(0, label, grouped[metric].agg(spec["agg"]))
+        result = result.reset_index()
+    else:
+        result = pd.DataFrame({"Shipments": [int(mask.sum())]})
+        if spec["agg"] == "late":
+            result.insert(0, LATE_SHARE_LABEL, [frame[metric].mean() * 100])
+            result.insert(0, label, [int(frame[metric].sum())])
+        elif metric is not None:
+            result.insert(0, label, [frame[metric].agg(spec["agg"])])
+
+    if spec["order"] and len(result) > 1:
+        result = result.sort_values(label, ascending=spec["order"] == "asc")
+    return result.head(spec["limit"]).reset_index(drop=True)
+
+
+def answer_table(df, question):
+    spec = plan_query(question, df)
+    if spec is None:
+        return None, None
+    return spec, run_query(df, spec)
+
+# ---------------------------------------------
+# 📝 Prompt
+# ---------------------------------------------
+RESULT_START = "Result table (CSV):"
+RESULT_END = "End of result table."
+
+
+def build_analytic_prompt(question, spec, result):
+    table = result.round(2).to_csv(index=False).strip()
+    return f"""
+You are a supply chain analyst. The query below was computed over the full pharmaceutical shipment dataset.
+
+Query: {describe_spec(spec)}
+
+{RESULT_START}
+{table}
+{RESULT_END}
+
+User Question:
+{question}
+
+Instructions:
+- Answer from the result table only; every number must come from it.
+- Do NOT include code. Do NOT invent data.
+- Return a concise, data-backed answer.
+"""
@@ -0,0 +1,176 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+RESPONSE_CACHE_PATH = os.path.join(".cache", "responses.sqlite")
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+_cache_lock = threading.Lock()
+_cache = None
+
+
+def _hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# ---------------------------------------------
+# 💬 LLM response cache
+# ---------------------------------------------
+# Exact entries are keyed by the prompt, the dataset fingerprint and the
+# model. The semantic layer reuses an answer when a new question's embedding
+# is close to a cached question's, but only within the same context scope:
+# the caller passes the result table for analytic answers and the extracted
+# filters for retrieval answers, so "freight in 2013" never answers "freight
+# in 2014". Entries expire after a TTL; the least recently used are evicted
+# once the entry count or total size is exceeded.
+class ResponseCache:
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT PRIMARY KEY,
+                    scope_key TEXT NOT NULL,
+                    embedding BLOB,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses (scope_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_lru ON responses (last_used_at)")
+
+    @contextmanager
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _record(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def _touch(self, conn, cache_key):
+        conn.execute("UPDATE responses SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?", (time.time(), cache_key))
+
+    def get(self, prompt, dataset_fingerprint=None, model_name=None, question_embedding=None, context=None):
+        # Returns (response, "exact" | "semantic") or (None, None)
+        cache_key = _hash(prompt, dataset_fingerprint, model_name)
+        fresh_after = time.time() - self.ttl_seconds
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT response FROM responses WHERE cache_key = ? AND created_at >= ?",
+                               (cache_key, fresh_after)).fetchone()
+            if row:
+                self._touch(conn, cache_key)
+                self._record("exact_hits")
+                return row[0], "exact"
+
+            if question_embedding is not None and context is not None:
+                rows = conn.execute(
+                    "SELECT cache_key, embedding, response FROM responses "
+                    "WHERE scope_key = ? AND created_at >= ? AND embedding IS NOT NULL",
+                    (_hash(context, dataset_fingerprint, model_name), fresh_after)
+                ).fetchall()
+                if rows:
+                    query = np.asarray(question_embedding, dtype=np.float32).ravel()
+                    query = query / max(np.linalg.norm(query), 1e-12)
+                    scores = np.stack([np.frombuffer(embedding, dtype=np.float32) for _, embedding, _ in rows]) @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        self._touch(conn, rows[best][0])
+                        self._record("semantic_hits")
+                        return rows[best][2], "semantic"
+
+        self._record("misses")
+        return None, None
+
+    def put(self, prompt, response, dataset_fingerprint=None, model_name=None, question_embedding=None, context=None):
+        # Without a context scope the entry is only reachable by an exact match
+        embedding = None
+        if question_embedding is not None and context is not None:
+            embedding = np.asarray(question_embedding, dtype=np.float32).ravel()
+            embedding = (embedding / max(np.linalg.norm(embedding), 1e-12)).tobytes()
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, scope_key, embedding, response, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (_hash(prompt, dataset_fingerprint, model_name), _hash(context, dataset_fingerprint, model_name),
+                 embedding, response, len(response.encode("utf-8")) + len(embedding or b""), now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        expired = conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)).rowcount
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+        evicted = 0
+        if count > self.max_entries or total > self.max_bytes:
+            for cache_key, size in conn.execute("SELECT cache_key, size FROM responses ORDER BY last_used_at").fetchall():
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+                count, total, evicted = count - 1, total - size, evicted + 1
+
+        with self._stats_lock:
+            self._stats["evictions"] += expired + evicted
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats.update({
+            "entries": entries,
+            "bytes": size,
+            "hit_rate": (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else None,
+        })
+        return stats
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+def get_response_cache(**kwargs):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(**kwargs)
+        else:
+            # The shared cache is built once; settings that differ from it would be silently ignored
+            conflicts = sorted(key for key, value in kwargs.items() if getattr(_cache, key, None) != value)
+            if conflicts:
+                raise ValueError(f"Response cache already created with different settings: {', '.join(conflicts)}")
+        return _cache
@@ -0,0 +1,255 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import pandas as pd
+from utils.date_parsing import DATE_COLUMNS, ensure_datetime
+
+DEFAULT_FILE_PATH = "SCMS_Delivery_History_Dataset_20150929 (2).csv"
+SQLITE_PATH = os.path.join(".cache", "shipments.sqlite")
+SQLITE_TABLE = "shipments"
+
+INDEXED_COLUMNS = ["Country", "Product Group", "Vendor", "Shipment Mode", "Delivered to Client Date"]
+
+# ---------------------------------------------
+# 🔎 Shared filter semantics
+# ---------------------------------------------
+# filters maps a column to a list of allowed values or a (start, end)
+# tuple with either side optional, the same shape columnar_store accepts.
+def apply_filters(df, filters):
+    mask = pd.Series(True, index=df.index)
+    for col, value in (filters or {}).items():
+        if isinstance(value, tuple):
+            start, end = value
+            if col in DATE_COLUMNS:
+                start = pd.Timestamp(start) if start is not None else None
+                end = pd.Timestamp(end) if end is not None else None
+            if start is not None:
+                mask &= df[col] >= start
+            if end is not None:
+                mask &= df[col] <= end
+        else:
+            mask &= df[col].isin(list(value))
+    return df[mask]
+
+
+def _append_result(total, appended, failures=None):
+    return {"total": total, "appended": appended, "failures": failures or []}
+
+# ---------------------------------------------
+# 🧩 Backend interface
+# ---------------------------------------------
+class StorageBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    def load(self):
+        pass
+
+    @abstractmethod
+    def append(self, df):
+        pass
+
+    def query(self, filters=None, columns=None):
+        df, _ = self.load()
+        df = apply_filters(df, filters)
+        return df[columns] if columns else df
+
+    def refresh(self):
+        pass
+
+
+class SheetsBackend(StorageBackend):
+    name = "sheets"
+
+    def __init__(self, ttl_seconds=None, compact=False):
+        from utils.google_sheets_loader import DEFAULT_TTL_SECONDS
+        self.ttl_seconds = DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.compact = compact
+
+    def load(self):
+        from utils.google_sheets_loader import load_data_from_sheets
+        return load_data_from_sheets(cached=True, ttl_seconds=self.ttl_seconds, compact=self.compact)
+
+    def append(self, df):
+        from utils.google_sheets_loader import append_rows_to_sheet, dataframe_to_rows
+        result = append_rows_to_sheet(dataframe_to_rows(df))
+        return _append_result(result["total"], result["appended"], result["failures"])
+
+    def refresh(self):
+        from utils.google_sheets_loader import refresh_sheets_snapshot
+        refresh_sheets_snapshot()
+
+
+class FileBackend(StorageBackend):
+    name = "file"
+
+    def __init__(self, path=DEFAULT_FILE_PATH):
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"Data file '{path}' not found; set STORAGE_PATH to a CSV or Parquet file")
+        self.path = path
+        self.is_columnar = path.endswith(".parquet")
+
+    def load(self):
+        if self.is_columnar:
+            from utils.columnar_store import load_columnar_snapshot
+            return load_columnar_snapshot(self.path)
+
+        from utils.data_loader import load_data
+        return load_data(self.path)
+
+    def append(self, df):
+        if self.is_columnar:
+            from utils.columnar_store import write_columnar_snapshot
+            existing, _ = self.load()
+            write_columnar_snapshot(pd.concat([existing, df], ignore_index=True), self.path)
+        else:
+            from utils.data_loader import detect_encoding
+            encoding = detect_encoding(self.path)
+            df.to_csv(self.path, mode="a", header=False, index=False, encoding=encoding)
+        return _append_result(len(df), len(df))
+
+    def query(self, filters=None, columns=None):
+        if self.is_columnar:
+            from utils.columnar_store import load_columnar_snapshot
+            df, _ = load_columnar_snapshot(self.path, columns=columns, filters=filters)
+            return df
+        return super().query(filters, columns)
+
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH, table=SQLITE_TABLE, seed_path=None):
+        self.path = path
+        self.table = table
+        # CSV or Parquet file imported the first time the table is missing
+        self.seed_path = seed_path
+
+    @contextmanager
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # A short-lived connection per call keeps the backend safe to share across threads
+        conn = sqlite3.connect(self.path)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _table_columns(self, conn):
+        rows = conn.execute(f'PRAGMA table_info("{self.table}")').fetchall()
+        return [row[1] for row in rows]
+
+    def _to_sql_frame(self, df):
+        df = df.copy()
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+            elif pd.api.types.is_datetime64_any_dtype(df[col]):
+                # ISO strings keep date-range predicates index-friendly in SQLite
+                df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S").where(df[col].notna(), None)
+        return df
+
+    def _create_indexes(self, conn):
+        columns = self._table_columns(conn)
+        for col in INDEXED_COLUMNS:
+            if col in columns:
+                index_name = "idx_" + "".join(c if c.isalnum() else "_" for c in col.lower())
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{self.table}" ("{col}")')
+
+    def _ensure_table(self, conn):
+        if self._table_columns(conn):
+            return
+        if not self.seed_path:
+            raise FileNotFoundError(f"No '{self.table}' table in '{self.path}'; set STORAGE_SEED_PATH to import one")
+
+        df, _ = FileBackend(self.seed_path).load()
+        self._to_sql_frame(df).to_sql(self.table, conn, index=False)
+        self._create_indexes(conn)
+
+    def import_dataframe(self, df, replace=True):
+        with self._connect() as conn:
+            self._to_sql_frame(df).to_sql(self.table, conn, if_exists="replace" if replace else "append", index=False)
+            self._create_indexes(conn)
+        return self
+
+    def _read(self, sql, params, conn):
+        df = pd.read_sql_query(sql, conn, params=params)
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = ensure_datetime(df[col])
+        return df
+
+    def load(self):
+        with self._connect() as conn:
+            self._ensure_table(conn)
+            df = self._read(f'SELECT * FROM "{self.table}"', [], conn)
+        return df, [col for col in DATE_COLUMNS if col in df.columns]
+
+    def append(self, df):
+        with self._connect() as conn:
+            columns = self._table_columns(conn)
+            frame = self._to_sql_frame(df)
+            if columns:
+                frame = frame.reindex(columns=columns)
+            frame.to_sql(self.table, conn, if_exists="append", index=False)
+            self._create_indexes(conn)
+        return _append_result(len(df), len(df))
+
+    def query(self, filters=None, columns=None):
+        clauses, params = [], []
+        for col, value in (filters or {}).items():
+            if isinstance(value, tuple):
+                start, end = value
+                if start is not None:
+                    clauses.append(f'"{col}" >= ?')
+                    params.append(self._sql_value(col, start))
+                if end is not None:
+                    clauses.append(f'"{col}" <= ?')
+                    params.append(self._sql_value(col, end))
+            else:
+                values = list(value)
+                if not values:
+                    clauses.append("0")
+                    continue
+                clauses.append(f'"{col}" IN ({", ".join("?" for _ in values)})')
+                params.extend(values)
+
+        select = ", ".join(f'"{col}"' for col in columns) if columns else "*"
+        sql = f'SELECT {select} FROM "{self.table}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+
+        with self._connect() as conn:
+            self._ensure_table(conn)
+            return self._read(sql, params, conn)
+
+    def _sql_value(self, col, value):
+        if col in DATE_COLUMNS:
+            return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+        return value
+
+
+def get_backend_from_env():
+    name = os.getenv("STORAGE_BACKEND", "sheets")
+    kwargs = {}
+    if name in ("file", "sqlite") and os.getenv("STORAGE_PATH"):
+        kwargs["path"] = os.getenv("STORAGE_PATH")
+    if name == "sqlite" and os.getenv("STORAGE_SEED_PATH"):
+        kwargs["seed_path"] = os.getenv("STORAGE_SEED_PATH")
+    return get_backend(name, **kwargs)
+
+
+def get_backend(name="sheets", **kwargs):
+    backends = {
+        "sheets": SheetsBackend,
+        "file": FileBackend,
+        "sqlite": SQLiteBackend,
+    }
+    if name not in backends:
+        raise ValueError(f"Unknown storage backend '{name}'. Choose from: {', '.join(backends)}")
+    return backends[name](**kwargs)
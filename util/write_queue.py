@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+QUEUE_PATH = os.path.join(".cache", "write_queue.sqlite")
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL_SECONDS = 2.0
+DEFAULT_BASE_BACKOFF_SECONDS = 2.0
+DEFAULT_MAX_BACKOFF_SECONDS = 300.0
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+
+_queue_lock = threading.Lock()
+_queue = None
+
+
+class SinkError(RuntimeError):
+    # after_row is the sheet mark of the failed attempt, handed back to the
+    # sink on retry so it can check whether the batch landed anyway
+    def __init__(self, message, after_row=None):
+        super().__init__(message)
+        self.after_row = after_row
+
+
+def _sheets_sink(rows, after_row=None):
+    from utils.google_sheets_loader import append_rows_to_sheet
+
+    # The queue owns retries and backoff, so the append itself is single-shot
+    result = append_rows_to_sheet(rows, batch_size=len(rows), max_retries=0, after_row=after_row)
+    if result["failures"]:
+        failure = result["failures"][-1]
+        raise SinkError(failure["error"], failure["after_row"])
+
+
+def make_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def content_hash(row):
+    return hashlib.sha256(json.dumps(row, default=str).encode("utf-8")).hexdigest()
+
+# ---------------------------------------------
+# 📮 Durable write-behind queue
+# ---------------------------------------------
+# Records land in a local SQLite queue first and a background thread
+# coalesces them into batched appends. A record is deduplicated by the
+# idempotency key its caller passes (one per form render) for as long as it
+# is retained, including after it was sent, so a double-clicked submit is
+# written once. Identical content under a new key is a legitimate repeat
+# order: it is queued, and only reported as a likely duplicate.
+#
+# A sink is called as sink(rows, after_row). A failed batch is retried as
+# the same rows, with the after_row of the SinkError it raised, so a write
+# that went through despite the error is not appended twice.
+class WriteBehindQueue:
+    def __init__(self, path=QUEUE_PATH, sink=None, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 base_backoff=DEFAULT_BASE_BACKOFF_SECONDS, max_backoff=DEFAULT_MAX_BACKOFF_SECONDS,
+                 retention_seconds=DEFAULT_RETENTION_SECONDS):
+        self.path = path
+        self.sink = sink or _sheets_sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention_seconds = retention_seconds
+
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"flushes": 0, "failed_flushes": 0, "sent": 0, "duplicates": 0, "likely_duplicates": 0,
+                       "last_flush_at": None, "last_error": None}
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_rows (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT UNIQUE NOT NULL,
+                    content_hash TEXT,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    sent_at REAL,
+                    last_error TEXT,
+                    failed_batch INTEGER,
+                    sheet_mark INTEGER
+                )
+            """)
+            # Queues created before content hashes and sheet marks were recorded
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(pending_rows)")]
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE pending_rows ADD COLUMN content_hash TEXT")
+            if "sheet_mark" not in columns:
+                conn.execute("ALTER TABLE pending_rows ADD COLUMN failed_batch INTEGER")
+                conn.execute("ALTER TABLE pending_rows ADD COLUMN sheet_mark INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_due ON pending_rows (status, next_attempt_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_content ON pending_rows (content_hash)")
+
+    @contextmanager
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def enqueue(self, row, idempotency_key=None):
+        # Returns (key, queued, likely_duplicate). Without a key the row is
+        # never deduplicated; likely_duplicate flags a retained row with the
+        # same content under another key, which is queued all the same
+        key = idempotency_key or make_idempotency_key()
+        row_hash = content_hash(row)
+        now = time.time()
+
+        with self._connect() as conn:
+            likely_duplicate = conn.execute(
+                "SELECT 1 FROM pending_rows WHERE content_hash = ? AND idempotency_key != ? LIMIT 1",
+                (row_hash, key)
+            ).fetchone() is not None
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO pending_rows (idempotency_key, content_hash, payload, enqueued_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, row_hash, json.dumps(row, default=str), now, now)
+            )
+            queued = cursor.rowcount == 1
+
+        with self._stats_lock:
+            self._stats["duplicates"] += not queued
+            self._stats["likely_duplicates"] += queued and likely_duplicate
+        if queued and self.depth() >= self.batch_size:
+            self._wake.set()
+
+        return key, queued, queued and likely_duplicate
+
+    def flush(self):
+        sent = 0
+        with self._flush_lock:
+            while True:
+                now = time.time()
+                with self._connect() as conn:
+                    first = conn.execute(
+                        "SELECT failed_batch, sheet_mark FROM pending_rows "
+                        "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT 1",
+                        (now,)
+                    ).fetchone()
+                    if first is None:
+                        break
+                    # A failed batch is retried on its own, so the rows sent
+                    # are the ones whose landing the sink checks for
+                    failed_batch, mark = first
+                    batch = conn.execute(
+                        "SELECT id, payload, attempts FROM pending_rows "
+                        "WHERE status = 'pending' AND next_attempt_at <= ? AND failed_batch IS ? ORDER BY id LIMIT ?",
+                        (now, failed_batch, self.batch_size)
+                    ).fetchall()
+
+                ids = [row_id for row_id, _, _ in batch]
+                placeholders = ", ".join("?" for _ in ids)
+                try:
+                    self.sink([json.loads(payload) for _, payload, _ in batch], after_row=mark)
+                except Exception as e:
+                    self._record_failure(batch, e)
+                    break
+
+                with self._connect() as conn:
+                    conn.execute(
+                        f"UPDATE pending_rows SET status = 'sent', sent_at = ?, last_error = NULL, "
+                        f"failed_batch = NULL, sheet_mark = NULL WHERE id IN ({placeholders})",
+                        [time.time()] + ids
+                    )
+                sent += len(batch)
+                with self._stats_lock:
+                    self._stats["flushes"] += 1
+                    self._stats["sent"] += len(batch)
+                    self._stats["last_flush_at"] = time.time()
+                    self._stats["last_error"] = None
+
+            self._prune()
+        return sent
+
+    def _record_failure(self, batch, error):
+        print("Error flushing write queue:", error)
+        with self._stats_lock:
+            self._stats["failed_flushes"] += 1
+            self._stats["last_error"] = str(error)
+
+        # The earliest mark is kept: the batch lands after it if it landed at all
+        mark = getattr(error, "after_row", None)
+        failed_batch = batch[0][0]
+        now = time.time()
+        with self._connect() as conn:
+            for row_id, _, attempts in batch:
+                delay = min(self.base_backoff * 2 ** attempts, self.max_backoff)
+                conn.execute(
+                    "UPDATE pending_rows SET attempts = ?, next_attempt_at = ?, last_error = ?, "
+                    "failed_batch = COALESCE(failed_batch, ?), sheet_mark = COALESCE(sheet_mark, ?) WHERE id = ?",
+                    (attempts + 1, now + delay, str(error), failed_batch, mark, row_id)
+                )
+
+    def _prune(self):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM pending_rows WHERE status = 'sent' AND sent_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+
+    def depth(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pending_rows WHERE status = 'pending'").fetchone()[0]
+
+    def metrics(self):
+        now = time.time()
+        with self._connect() as conn:
+            depth, oldest, max_attempts = conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), MAX(attempts) FROM pending_rows WHERE status = 'pending'"
+            ).fetchone()
+
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        return {
+            **stats,
+            "depth": depth,
+            "lag_seconds": now - oldest if oldest is not None else 0.0,
+            "max_attempts": max_attempts or 0,
+            "running": self._thread is not None and self._thread.is_alive(),
+        }
+
+    # ---------------------------------------------
+    # 🧵 Background writer thread
+    # ---------------------------------------------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind-queue", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Drain whatever is already due before shutting down
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("Write queue worker error:", e)
+
+
+def get_write_queue(**kwargs):
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteBehindQueue(**kwargs).start()
+        return _queue